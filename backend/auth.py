@@ -1,5 +1,9 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -7,17 +11,37 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from models import TokenData, User
+from metrics import (
+    PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED,
+    USER_CACHE_HITS, USER_CACHE_MISSES
+)
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# EventSource cannot send an Authorization header, so event streams are opened
+# with a short-lived ticket in the URL instead of the access token. Tickets only
+# open streams, and carry the access token's expiry so streams end with it.
+EVENTS_TICKET_TYPE = "events"
+EVENTS_TICKET_EXPIRE_SECONDS = int(os.getenv("EVENTS_TICKET_EXPIRE_SECONDS", "60"))
+
+# Password hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+# Authenticated user cache configuration
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
 
 # MongoDB connection
 from database import db
+from purge import NOT_DELETED
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -25,6 +49,35 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+password_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
+async def run_password_job(func, *args):
+    """Run a password hashing function in the bounded hashing pool."""
+    if PASSWORD_HASH_QUEUE_DEPTH.value >= PASSWORD_HASH_MAX_QUEUE:
+        PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry",
+            headers={"Retry-After": "1"},
+        )
+    
+    PASSWORD_HASH_QUEUE_DEPTH.inc()
+    def job():
+        PASSWORD_HASH_QUEUE_DEPTH.dec()
+        return func(*args)
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hash_executor, job)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_password_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -35,8 +88,63 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_events_ticket(user: User, access_token: str) -> str:
+    """A ticket for opening the user's event stream, valid until the access token expires at most."""
+    session_expires_at = jwt.get_unverified_claims(access_token)["exp"]
+    now = datetime.utcnow()
+    expires_at = min(now + timedelta(seconds=EVENTS_TICKET_EXPIRE_SECONDS), datetime.utcfromtimestamp(session_expires_at))
+    return create_access_token(
+        {"sub": user.email, "uid": user.id, "typ": EVENTS_TICKET_TYPE, "session_exp": session_expires_at},
+        expires_at - now
+    )
+
+class UserCache:
+    """Bounded LRU cache of resolved users, each entry expiring after a TTL."""
+    
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+    
+    def get(self, key: str) -> Optional[User]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+    
+    def set(self, key: str, user: User):
+        self._entries[key] = (user, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, user: User):
+        self._entries.pop(user.id, None)
+        self._entries.pop(user.email, None)
+    
+    def clear(self):
+        self._entries.clear()
+
+# Per-process, so changes made by another worker are picked up once the TTL expires
+user_cache = UserCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(user: User):
+    """Drop a user from the cache. Call whenever a user record changes."""
+    user_cache.invalidate(user)
+
 async def get_user_by_email(email: str):
-    user_doc = await db.users.find_one({"email": email})
+    user_doc = await db.users.find_one({"email": email, **NOT_DELETED})
+    if user_doc:
+        return User(**user_doc)
+    return None
+
+async def get_user_by_id(user_id: str):
+    user_doc = await db.users.find_one({"id": user_id, **NOT_DELETED})
     if user_doc:
         return User(**user_doc)
     return None
@@ -45,26 +153,52 @@ async def authenticate_user(email: str, password: str):
     user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return False
     return user
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await get_user_from_token(credentials.credentials)
+
+async def get_user_from_token(token: str) -> User:
+    """Resolve an access token to its user, raising 401 if it is invalid or expired."""
+    user, _ = await resolve_token(token, None)
+    return user
+
+async def get_user_from_events_ticket(ticket: str) -> Tuple[User, int]:
+    """The ticket's user, and when the access token it was issued for expires (a Unix timestamp)."""
+    user, payload = await resolve_token(ticket, EVENTS_TICKET_TYPE)
+    return user, payload["session_exp"]
+
+async def resolve_token(token: str, token_type: Optional[str]) -> Tuple[User, dict]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        # Access tokens carry no type; a ticket is not accepted in their place or the other way round
+        if email is None or payload.get("typ") != token_type:
             raise credentials_exception
-        token_data = TokenData(email=email)
+        token_data = TokenData(email=email, user_id=payload.get("uid"))
     except JWTError:
         raise credentials_exception
-    user = await get_user_by_email(email=token_data.email)
+    
+    # Tokens issued before the uid claim existed are keyed by email
+    cache_key = token_data.user_id or token_data.email
+    user = user_cache.get(cache_key)
+    if user is not None:
+        USER_CACHE_HITS.inc()
+        return user, payload
+    
+    USER_CACHE_MISSES.inc()
+    if token_data.user_id:
+        user = await get_user_by_id(token_data.user_id)
+    else:
+        user = await get_user_by_email(email=token_data.email)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    user_cache.set(cache_key, user)
+    return user, payload
\ No newline at end of file
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from metrics import RESPONSE_CACHE_HITS, RESPONSE_CACHE_MISSES
+
+# Per-user cache of serialized API responses, stored as (etag, body) pairs.
+#
+# Each user has a generation number that every mutation bumps. Entries are
+# stored under the generation that was current when the response was built,
+# so a response computed while a write was in flight can never be served
+# after that write's invalidation. Entries also expire after a TTL, which
+# bounds staleness when reads are served by replica set secondaries.
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+
+CacheEntry = Tuple[str, bytes]
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+class MemoryCacheBackend:
+    """In-process LRU. Each worker keeps its own copy."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._generations = {}
+
+    async def generation(self, user_id: str) -> int:
+        return self._generations.get(user_id, 0)
+
+    async def get(self, user_id: str, generation: int, key: str) -> Optional[CacheEntry]:
+        cache_key = (user_id, generation, key)
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[cache_key]
+            return None
+        self._entries.move_to_end(cache_key)
+        return value
+
+    async def set(self, user_id: str, generation: int, key: str, value: CacheEntry):
+        if generation != self._generations.get(user_id, 0):
+            return
+        cache_key = (user_id, generation, key)
+        self._entries[cache_key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id: str):
+        # Entries of older generations are unreachable and age out of the LRU
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+class RedisCacheBackend:
+    """Cache shared by all workers, on any Redis-compatible server."""
+
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the redis package (pip install redis)")
+        self.redis = redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _generation_key(user_id: str) -> str:
+        return f"habitflow:response-cache:{user_id}:generation"
+
+    @staticmethod
+    def _entries_key(user_id: str, generation: int) -> str:
+        return f"habitflow:response-cache:{user_id}:{generation}"
+
+    async def generation(self, user_id: str) -> int:
+        value = await self.redis.get(self._generation_key(user_id))
+        return int(value) if value else 0
+
+    async def get(self, user_id: str, generation: int, key: str) -> Optional[CacheEntry]:
+        value = await self.redis.hget(self._entries_key(user_id, generation), key)
+        if value is None:
+            return None
+        etag, body = value.split(b"\n", 1)
+        return etag.decode(), body
+
+    async def set(self, user_id: str, generation: int, key: str, value: CacheEntry):
+        etag, body = value
+        entries_key = self._entries_key(user_id, generation)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(entries_key, key, etag.encode() + b"\n" + body)
+            pipe.expire(entries_key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def invalidate(self, user_id: str):
+        await self.redis.incr(self._generation_key(user_id))
+
+class NullCacheBackend:
+    """Disables response caching."""
+
+    async def generation(self, user_id: str) -> int:
+        return 0
+
+    async def get(self, user_id: str, generation: int, key: str) -> Optional[CacheEntry]:
+        return None
+
+    async def set(self, user_id: str, generation: int, key: str, value: CacheEntry):
+        pass
+
+    async def invalidate(self, user_id: str):
+        pass
+
+def create_cache_backend(name: str = RESPONSE_CACHE_BACKEND):
+    if name == "memory":
+        return MemoryCacheBackend(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+    if name == "redis":
+        return RedisCacheBackend(RESPONSE_CACHE_URL, RESPONSE_CACHE_TTL_SECONDS)
+    if name == "none":
+        return NullCacheBackend()
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {name}")
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get_or_build(self, user_id: str, key: str, build, serialize) -> CacheEntry:
+        """Return the cached (etag, body) for key, building and storing it on a miss.
+
+        build is an async callable producing the response value and serialize
+        turns that value into bytes.
+        """
+        generation = await self.backend.generation(user_id)
+        entry = await self.backend.get(user_id, generation, key)
+        if entry is not None:
+            RESPONSE_CACHE_HITS.inc()
+            return entry
+
+        RESPONSE_CACHE_MISSES.inc()
+        body = serialize(await build())
+        entry = (make_etag(body), body)
+        await self.backend.set(user_id, generation, key, entry)
+        return entry
+
+    async def invalidate(self, user_id: str):
+        """Drop every cached response for a user. Call after any write to their data."""
+        await self.backend.invalidate(user_id)
+
+response_cache = ResponseCache(create_cache_backend())
@@ -1,12 +1,167 @@
+from dataclasses import dataclass
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, ReadPreference, monitoring
 import os
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
+from metrics import MONGO_POOL_CHECKOUT_SECONDS, MONGO_POOL_CHECKOUT_FAILURES
+from instrumentation import MongoCommandListener
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+@dataclass
+class MongoSettings:
+    """MongoDB client settings, read from the environment."""
+    url: str
+    db_name: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    # How long a request waits for a free pooled connection before failing
+    wait_queue_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    # Upper bound on a single operation, so slow queries cannot hang requests
+    socket_timeout_ms: int = 30000
+    # Unavailable compressors (zstd needs zstandard, snappy needs python-snappy) are skipped
+    compressors: str = "zstd,zlib"
+    # Read preference for the calendar, daily counts and exports. These show users
+    # their own writes, so the default reads from the primary while it is up; a
+    # secondary preference offloads the primary at the cost of lagging behind writes.
+    stats_read_preference: str = "primaryPreferred"
+    # Multi-document transactions need a replica set or sharded cluster
+    transactions: bool = False
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        return cls(
+            url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            max_pool_size=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+            min_pool_size=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+            max_idle_time_ms=_optional_int("MONGO_MAX_IDLE_TIME_MS"),
+            wait_queue_timeout_ms=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+            server_selection_timeout_ms=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+            connect_timeout_ms=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+            socket_timeout_ms=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+            compressors=os.getenv("MONGO_COMPRESSORS", "zstd,zlib"),
+            stats_read_preference=os.getenv("MONGO_STATS_READ_PREFERENCE", "primaryPreferred"),
+            transactions=os.getenv("MONGO_TRANSACTIONS", "false").lower() == "true",
+        )
+
+    def client_options(self) -> dict:
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+        }
+        if self.compressors:
+            options["compressors"] = self.compressors
+        return {key: value for key, value in options.items() if value is not None}
+
+class PoolCheckoutListener(monitoring.ConnectionPoolListener):
+    """Records how long requests wait to check a connection out of the pool."""
+
+    def __init__(self):
+        # Checkout started/finished events fire on the same driver thread
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            MONGO_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+            self._local.started = None
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.inc()
+        self._local.started = None
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_checked_in(self, event): pass
+
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
\ No newline at end of file
+settings = MongoSettings.from_env()
+client = AsyncIOMotorClient(
+    settings.url,
+    event_listeners=[PoolCheckoutListener(), MongoCommandListener()],
+    **settings.client_options()
+)
+db = client[settings.db_name]
+# Same database, read with MONGO_STATS_READ_PREFERENCE
+stats_db = client.get_database(
+    settings.db_name,
+    read_preference=READ_PREFERENCES[settings.stats_read_preference]
+)
+
+async def run_in_transaction(callback):
+    """Await callback(session) inside a transaction, retried on transient errors.
+
+    Without MONGO_TRANSACTIONS the callback runs with session=None and its
+    writes are applied one by one.
+    """
+    if not settings.transactions:
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
+async def ensure_indexes():
+    """Create the indexes the API relies on. Safe to run on every startup."""
+    await db.users.create_indexes([
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("deleted_at", ASCENDING)], partialFilterExpression={"deleted_at": {"$type": "date"}}),
+    ])
+    await db.habits.create_indexes([
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("version", ASCENDING)]),
+        # Only soft-deleted habits, for the purge worker
+        IndexModel([("deleted_at", ASCENDING)], partialFilterExpression={"deleted_at": {"$type": "date"}}),
+    ])
+    # Also enforces one completion per habit per day
+    await db.habit_completions.create_indexes([
+        IndexModel(
+            [("user_id", ASCENDING), ("habit_id", ASCENDING), ("completion_date", ASCENDING)],
+            unique=True
+        ),
+        IndexModel([("user_id", ASCENDING), ("completion_date", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("version", ASCENDING)]),
+    ])
+    await db.daily_rollups.create_indexes([
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)], unique=True),
+    ])
+    await db.import_jobs.create_indexes([
+        IndexModel([("id", ASCENDING)], unique=True),
+    ])
+    await db.tombstones.create_indexes([
+        IndexModel([("user_id", ASCENDING), ("version", ASCENDING)]),
+    ])
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+import orjson
+
+from metrics import EVENT_STREAMS_DROPPED, EVENT_STREAMS_OPEN
+
+# Change notifications pushed to a user's open sessions over Server-Sent Events.
+#
+# Writes publish a small event ({"type": ..., "habit_id": ..., "version": ...})
+# for the user whose data they changed. Single-habit changes also carry the
+# habit or completion result, so sessions can apply them without a reload.
+# Each worker fans events out to its own
+# open streams through one bounded queue per stream. With EVENTS_BACKEND=redis
+# events are relayed through Redis pub/sub, so streams held by other workers
+# receive them too.
+#
+# An idle stream holds a queue and a suspended coroutine, nothing else. A
+# stream that falls EVENTS_QUEUE_SIZE events behind is closed; the client
+# reconnects and catches up with GET /api/sync. Streams also close when the
+# session they were opened for expires, and after an account.deleted event.
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENTS_URL = os.getenv("EVENTS_URL", "redis://localhost:6379/0")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "25"))
+EVENTS_CHANNEL = "habitflow:events"
+
+# Sessions send an id of their own choosing so their writes are not echoed back to them
+CLIENT_ID_HEADER = "X-Client-Id"
+
+# Sent to every stream of an account as it is deleted, then the streams close
+ACCOUNT_DELETED_EVENT = "account.deleted"
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """One open stream's pending events."""
+
+    def __init__(self, user_id: str, client_id: Optional[str], max_size: int):
+        self.user_id = user_id
+        self.client_id = client_id
+        self.queue = asyncio.Queue(max_size)
+        self.overflowed = False
+
+    def deliver(self, event: Dict, origin: Optional[str]):
+        if origin is not None and origin == self.client_id:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if not self.overflowed:
+                self.overflowed = True
+                EVENT_STREAMS_DROPPED.inc()
+
+class MemoryEventBackend:
+    """Delivers events to streams in this worker only."""
+
+    def __init__(self):
+        self.hub = None
+
+    def attach(self, hub: "EventHub"):
+        self.hub = hub
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, user_id: str, event: Dict, origin: Optional[str]):
+        self.hub.dispatch(user_id, event, origin)
+
+class RedisEventBackend:
+    """Relays events between workers through Redis pub/sub."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("EVENTS_BACKEND=redis requires the redis package (pip install redis)")
+        self.redis = redis.from_url(url)
+        self.hub = None
+        self._listener = None
+
+    def attach(self, hub: "EventHub"):
+        self.hub = hub
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.redis.aclose()
+
+    async def publish(self, user_id: str, event: Dict, origin: Optional[str]):
+        await self.redis.publish(EVENTS_CHANNEL, orjson.dumps({"user_id": user_id, "origin": origin, "event": event}))
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(EVENTS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        data = orjson.loads(message["data"])
+                        self.hub.dispatch(data["user_id"], data["event"], data["origin"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Events published while reconnecting are lost; clients still catch up through sync
+                logger.exception("Event relay disconnected, reconnecting")
+                await asyncio.sleep(1)
+
+def create_event_backend(name: str = EVENTS_BACKEND):
+    if name == "memory":
+        return MemoryEventBackend()
+    if name == "redis":
+        return RedisEventBackend(EVENTS_URL)
+    raise ValueError(f"Unknown EVENTS_BACKEND: {name}")
+
+class EventHub:
+    """This worker's open streams, fed by the configured backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        # Attached up front: the memory backend delivers without start(), as when startup hooks do not run
+        backend.attach(self)
+
+    async def start(self):
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+
+    def subscribe(self, user_id: str, client_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(user_id, client_id, EVENTS_QUEUE_SIZE)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        EVENT_STREAMS_OPEN.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+        EVENT_STREAMS_OPEN.dec()
+
+    def dispatch(self, user_id: str, event: Dict, origin: Optional[str] = None):
+        """Queue an event on every stream of the user open in this worker."""
+        for subscription in self._subscriptions.get(user_id, ()):
+            subscription.deliver(event, origin)
+
+    async def publish(self, user_id: str, event: Dict, origin: Optional[str] = None):
+        """Notify the user's other sessions of a change. Call after the write has landed.
+
+        Best effort: the write already succeeded, and clients that miss an event
+        pick the change up on their next sync.
+        """
+        try:
+            await self.backend.publish(user_id, event, origin)
+        except Exception:
+            logger.exception("Failed to publish %s event", event.get("type"))
+
+    async def stream(
+        self,
+        user_id: str,
+        client_id: Optional[str] = None,
+        expires_at: Optional[float] = None
+    ) -> AsyncIterator[bytes]:
+        """Server-Sent Events for one session, with a comment line as heartbeat while idle.
+
+        expires_at is a Unix timestamp at which the stream is closed.
+        """
+        subscription = self.subscribe(user_id, client_id)
+        try:
+            # Sent straight away so proxies and the browser see the stream open
+            yield b"retry: 5000\n\n"
+            while not subscription.overflowed:
+                timeout = EVENTS_HEARTBEAT_SECONDS
+                if expires_at is not None:
+                    remaining = expires_at - time.time()
+                    if remaining <= 0:
+                        break
+                    timeout = min(timeout, remaining)
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+                if event["type"] == ACCOUNT_DELETED_EVENT:
+                    break
+        finally:
+            # Also runs when the client disconnects
+            self.unsubscribe(subscription)
+
+event_hub = EventHub(create_event_backend())
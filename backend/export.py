@@ -0,0 +1,95 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator
+
+import orjson
+
+from database import stats_db
+from purge import NOT_DELETED, exclude_deleted_habits
+
+# Streaming exports of a user's habits and full completion history. Documents
+# are read from cursors in fixed-size batches and each batch is written out as
+# one chunk, so memory use does not depend on the size of the history.
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+HABIT_FIELDS = [
+    "id", "name", "description", "color", "icon", "target_days", "created_at",
+    "current_streak", "longest_streak", "last_completion_date", "completion_count",
+]
+COMPLETION_FIELDS = ["id", "habit_id", "completion_date", "created_at"]
+CSV_FIELDS = ["habit_id", "habit_name", "completion_id", "completion_date", "created_at"]
+
+def _projection(fields):
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+def _habits_cursor(user_id: str):
+    return stats_db.habits.find(
+        {"user_id": user_id, **NOT_DELETED}, _projection(HABIT_FIELDS)
+    ).batch_size(EXPORT_BATCH_SIZE)
+
+async def _completions_cursor(user_id: str):
+    # Habit then date order comes straight off the (user_id, habit_id, completion_date) index
+    return stats_db.habit_completions.find(
+        await exclude_deleted_habits({"user_id": user_id}), _projection(COMPLETION_FIELDS)
+    ).sort([("habit_id", 1), ("completion_date", 1)]).batch_size(EXPORT_BATCH_SIZE)
+
+async def export_ndjson(user_id: str) -> AsyncIterator[bytes]:
+    """One JSON object per line: every habit, then every completion, each tagged with its type."""
+    for record_type, cursor in (("habit", _habits_cursor(user_id)), ("completion", await _completions_cursor(user_id))):
+        lines = []
+        try:
+            async for doc in cursor:
+                lines.append(orjson.dumps({"type": record_type, **doc}))
+                if len(lines) >= EXPORT_BATCH_SIZE:
+                    yield b"\n".join(lines) + b"\n"
+                    lines = []
+        finally:
+            # Also runs when the client disconnects mid-export
+            await cursor.close()
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+async def export_csv(user_id: str) -> AsyncIterator[bytes]:
+    """One row per completion, labelled with its habit's name."""
+    # Habits are few per user; only their names are kept while streaming completions
+    habit_names = {}
+    async for habit_doc in stats_db.habits.find({"user_id": user_id, **NOT_DELETED}, {"_id": 0, "id": 1, "name": 1}):
+        habit_names[habit_doc["id"]] = habit_doc["name"]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    rows = 0
+    cursor = await _completions_cursor(user_id)
+    try:
+        async for completion in cursor:
+            created_at = completion.get("created_at")
+            writer.writerow([
+                completion["habit_id"],
+                habit_names.get(completion["habit_id"], ""),
+                completion.get("id", ""),
+                completion["completion_date"],
+                created_at.isoformat() if isinstance(created_at, datetime) else created_at or "",
+            ])
+            rows += 1
+            if rows >= EXPORT_BATCH_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                rows = 0
+    finally:
+        await cursor.close()
+    yield buffer.getvalue().encode()
+
+EXPORTERS = {
+    "ndjson": export_ndjson,
+    "csv": export_csv,
+}
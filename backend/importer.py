@@ -0,0 +1,109 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# Parsing for completion history imports. Uploads are copied to a private
+# temporary file and read back in chunks on a worker thread, so an import of
+# years of check-ins never holds more than one chunk in memory.
+#
+# Accepted inputs, matching what GET /api/export produces:
+#   csv     header row with completion_date and habit_id and/or habit_name
+#   ndjson  one object per line with the same keys; lines of type "habit"
+#           map exported habit ids to names and are not imported themselves
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(200 * 1024 * 1024)))
+IMPORT_MAX_ERRORS = 50
+
+IMPORT_EXTENSIONS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+
+class ImportRecord(NamedTuple):
+    line: int
+    habit_id: Optional[str]
+    habit_name: Optional[str]
+    completion_date: str
+
+class ParsedChunk(NamedTuple):
+    records: List[ImportRecord]
+    errors: List[Dict]  # {"line": ..., "message": ...}
+
+def detect_format(filename: Optional[str], requested: Optional[str]) -> Optional[str]:
+    """The upload's format, from the explicit parameter or else the file extension."""
+    if requested:
+        return requested if requested in ("csv", "ndjson") else None
+    extension = os.path.splitext(filename or "")[1].lower()
+    return IMPORT_EXTENSIONS.get(extension)
+
+def spool_upload(source) -> str:
+    """Copy an uploaded file object to a temporary file the import owns. Returns its path."""
+    with tempfile.NamedTemporaryFile(prefix="habitflow-import-", delete=False) as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+        return target.name
+
+def _is_valid_date(value) -> bool:
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return False
+    return True
+
+def _to_record(line: int, row: Dict, habit_names: Dict[str, str]):
+    """An ImportRecord, or an error message for an invalid row."""
+    completion_date = row.get("completion_date")
+    if not _is_valid_date(completion_date):
+        return f"completion_date must be a YYYY-MM-DD date, got {completion_date!r}"
+    habit_id = row.get("habit_id") or None
+    habit_name = row.get("habit_name") or habit_names.get(habit_id) or None
+    if habit_id is None and habit_name is None:
+        return "habit_id or habit_name is required"
+    return ImportRecord(line, habit_id, habit_name, completion_date)
+
+def _csv_rows(f) -> Iterator:
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, row
+
+def _ndjson_rows(f, habit_names: Dict[str, str]) -> Iterator:
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, "invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "expected a JSON object"
+            continue
+        if row.get("type") == "habit":
+            if row.get("id") and row.get("name"):
+                habit_names[row["id"]] = row["name"]
+            continue
+        yield line_number, row
+
+def iter_chunks(path: str, format: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[ParsedChunk]:
+    """Parse and validate an upload, chunk_size rows at a time."""
+    habit_names = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = _csv_rows(f) if format == "csv" else _ndjson_rows(f, habit_names)
+        records, errors = [], []
+        for line_number, row in rows:
+            result = row if isinstance(row, str) else _to_record(line_number, row, habit_names)
+            if isinstance(result, str):
+                errors.append({"line": line_number, "message": result})
+            else:
+                records.append(result)
+            if len(records) + len(errors) >= chunk_size:
+                yield ParsedChunk(records, errors)
+                records, errors = [], []
+        if records or errors:
+            yield ParsedChunk(records, errors)
@@ -0,0 +1,142 @@
+import functools
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+
+from metrics import (
+    HTTP_REQUEST_SECONDS,
+    MONGO_COMMAND_SECONDS,
+    MONGO_COMMANDS_PER_REQUEST,
+    STREAK_CALLS,
+    STREAK_SECONDS,
+)
+
+# Per-request accounting of where time goes: MongoDB commands and streak
+# computation. Motor runs pymongo on executor threads with a copy of the
+# caller's context, so command events see the RequestStats of the request
+# that issued them.
+
+# Requests carrying this header get a Server-Timing breakdown. Empty disables it.
+BREAKDOWN_HEADER = os.getenv("REQUEST_BREAKDOWN_HEADER", "X-Request-Breakdown").lower()
+
+# Commands issued by the driver itself rather than by application code
+DRIVER_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "endSessions", "buildInfo", "saslStart", "saslContinue"}
+
+class RequestStats:
+    """Counters for a single request, updated from the event loop and driver threads."""
+
+    def __init__(self):
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.streak_calls = 0
+        self.streak_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_db(self, seconds: float):
+        with self._lock:
+            self.db_calls += 1
+            self.db_seconds += seconds
+
+    def record_streaks(self, seconds: float):
+        with self._lock:
+            self.streak_calls += 1
+            self.streak_seconds += seconds
+
+    def server_timing(self, total_seconds: float) -> str:
+        return ", ".join([
+            f"app;dur={total_seconds * 1000:.2f}",
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_calls} commands"',
+            f'streaks;dur={self.streak_seconds * 1000:.2f};desc="{self.streak_calls} calls"',
+        ])
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Set while inside an instrumented streak function, so nested calls are not timed twice
+_in_streak_call: ContextVar[bool] = ContextVar("in_streak_call", default=False)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command and attributes it to the current request."""
+
+    def _record(self, event):
+        if event.command_name in DRIVER_COMMANDS:
+            return
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_SECONDS.labels(event.command_name).observe(seconds)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.record_db(seconds)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+def count_streak_calls(func):
+    """Count and time calls into a streak computation function."""
+    calls = STREAK_CALLS.labels(func.__name__)
+    seconds = STREAK_SECONDS.labels(func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        calls.inc()
+        if _in_streak_call.get():
+            return func(*args, **kwargs)
+        token = _in_streak_call.set(True)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _in_streak_call.reset(token)
+            seconds.observe(elapsed)
+            stats = request_stats.get()
+            if stats is not None:
+                stats.record_streaks(elapsed)
+    return wrapper
+
+class InstrumentationMiddleware:
+    """Records latency per route template and MongoDB commands per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        breakdown = bool(BREAKDOWN_HEADER) and BREAKDOWN_HEADER in Headers(scope=scope)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if breakdown:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            # The router stores the matched route in the scope; label by its template
+            # so /api/habits/{habit_id} is one series rather than one per habit
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status_code)).observe(
+                time.perf_counter() - started
+            )
+            MONGO_COMMANDS_PER_REQUEST.labels(route).observe(stats.db_calls)
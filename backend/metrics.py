@@ -0,0 +1,251 @@
+import threading
+from typing import Dict, List, Tuple
+
+# Minimal in-process metrics, rendered in the Prometheus text format by
+# render_prometheus(). Values are updated from both the event loop and
+# executor threads, so every mutation takes the metric's lock.
+
+REGISTRY = []
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonically increasing value."""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def samples(self, labels: Dict[str, str]) -> List[Tuple[str, Dict[str, str], float]]:
+        return [(self.name, labels, self._value)]
+
+class Gauge:
+    """Value that can go up and down."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    def samples(self, labels: Dict[str, str]) -> List[Tuple[str, Dict[str, str], float]]:
+        return [(self.name, labels, self._value)]
+
+class Histogram:
+    """Distribution of observed values over cumulative buckets."""
+    type = "histogram"
+
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS, register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def bucket_counts(self):
+        """(upper bound, cumulative count) pairs."""
+        with self._lock:
+            return list(zip(self.buckets, self._counts))
+
+    def samples(self, labels: Dict[str, str]) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            value_sum = self._sum
+        samples = [
+            (f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count)
+            for bound, count in zip(self.buckets, counts)
+        ]
+        samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, total))
+        samples.append((f"{self.name}_sum", labels, value_sum))
+        samples.append((f"{self.name}_count", labels, total))
+        return samples
+
+class Labeled:
+    """A family of metrics of one type, one child per combination of label values."""
+
+    def __init__(self, metric_class, name: str, documentation: str, labelnames: Tuple[str, ...], **kwargs):
+        self.metric_class = metric_class
+        self.type = metric_class.type
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._kwargs = kwargs
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self.metric_class(
+                    self.name, self.documentation, register=False, **self._kwargs
+                ))
+        return child
+
+    def samples(self, labels: Dict[str, str]) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for values, child in list(self._children.items()):
+            samples.extend(child.samples({**labels, **dict(zip(self.labelnames, values))}))
+        return samples
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples({}):
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# Password hashing
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Password hash/verify jobs waiting for a hashing thread"
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash/verify jobs rejected because the queue was full"
+)
+
+# Authenticated user cache
+USER_CACHE_HITS = Counter(
+    "user_cache_hits_total",
+    "Authenticated requests resolved from the user cache"
+)
+USER_CACHE_MISSES = Counter(
+    "user_cache_misses_total",
+    "Authenticated requests that had to load the user from the database"
+)
+
+# MongoDB connection pool
+MONGO_POOL_CHECKOUT_SECONDS = Histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the MongoDB pool"
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total",
+    "MongoDB connection checkouts that failed, e.g. on wait queue timeout"
+)
+
+# Response cache
+RESPONSE_CACHE_HITS = Counter(
+    "response_cache_hits_total",
+    "Cached API responses served without recomputation"
+)
+RESPONSE_CACHE_MISSES = Counter(
+    "response_cache_misses_total",
+    "Cacheable API responses that had to be computed"
+)
+
+# Server-Sent Events
+EVENT_STREAMS_OPEN = Gauge(
+    "event_streams_open",
+    "Server-Sent Events streams currently open in this worker"
+)
+EVENT_STREAMS_DROPPED = Counter(
+    "event_streams_dropped_total",
+    "Event streams closed because the client fell too far behind"
+)
+
+# Purges of deleted habits and accounts
+PURGED_DOCUMENTS = Labeled(
+    Counter, "purged_documents_total",
+    "Documents removed by the background purge of deleted data", ("collection",)
+)
+
+# Requests
+HTTP_REQUEST_SECONDS = Labeled(
+    Histogram, "http_request_duration_seconds",
+    "HTTP request latency by route template", ("method", "route", "status")
+)
+
+# MongoDB commands
+MONGO_COMMAND_SECONDS = Labeled(
+    Histogram, "mongo_command_duration_seconds",
+    "MongoDB command latency by command name", ("command",)
+)
+MONGO_COMMANDS_PER_REQUEST = Labeled(
+    Histogram, "mongo_commands_per_request",
+    "MongoDB commands issued while serving one request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+
+# Streak computation
+STREAK_CALLS = Labeled(
+    Counter, "streak_computation_calls_total",
+    "Calls into the streak computation functions", ("function",)
+)
+STREAK_SECONDS = Labeled(
+    Histogram, "streak_computation_duration_seconds",
+    "Time spent in the streak computation functions", ("function",)
+)
@@ -1,8 +1,18 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import uuid
 
+def check_timezone(value: Optional[str]) -> Optional[str]:
+    """Accept IANA timezone names such as Europe/Berlin; None means server-local time."""
+    if value is not None:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {value}")
+    return value
+
 # User Models
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -10,12 +20,29 @@ class User(BaseModel):
     email: str
     password_hash: str
     theme: str = "light"
+    # IANA timezone used to decide what "today" is; None means server-local time
+    timezone: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class UserCreate(BaseModel):
     name: str
     email: str
     password: str
+    timezone: Optional[str] = None
+
+    @field_validator("timezone")
+    @classmethod
+    def validate_timezone(cls, value: Optional[str]) -> Optional[str]:
+        return check_timezone(value)
+
+class UserSettingsUpdate(BaseModel):
+    theme: Optional[str] = None
+    timezone: Optional[str] = None
+
+    @field_validator("timezone")
+    @classmethod
+    def validate_timezone(cls, value: Optional[str]) -> Optional[str]:
+        return check_timezone(value)
 
 class UserLogin(BaseModel):
     email: str
@@ -26,6 +53,7 @@ class UserResponse(BaseModel):
     name: str
     email: str
     theme: str
+    timezone: Optional[str] = None
     created_at: datetime
 
 # Habit Models
@@ -38,6 +66,14 @@ class Habit(BaseModel):
     icon: str = "brain"
     target_days: int = 30
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Streak statistics, maintained incrementally as completions change.
+    # current_streak is the run of days ending at last_completion_date.
+    current_streak: int = 0
+    longest_streak: int = 0
+    last_completion_date: Optional[str] = None
+    completion_count: int = 0
+    # Sync version of the last write to the habit or its statistics
+    version: int = 0
 
 class HabitCreate(BaseModel):
     name: str
@@ -65,6 +101,7 @@ class HabitWithStats(BaseModel):
     current_streak: int = 0
     longest_streak: int = 0
     completion_count: int = 0
+    last_completion_date: Optional[str] = None
     completed_dates: List[str] = []
 
 # Habit Completion Models
@@ -74,10 +111,79 @@ class HabitCompletion(BaseModel):
     user_id: str
     completion_date: str  # YYYY-MM-DD format
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = 0
 
 class HabitCompletionCreate(BaseModel):
     completion_date: str  # YYYY-MM-DD format
 
+    @field_validator("completion_date")
+    @classmethod
+    def validate_completion_date(cls, value: str) -> str:
+        datetime.strptime(value, "%Y-%m-%d")
+        return value
+
+class StatsDelta(BaseModel):
+    """Change a mutation made to the matching StatsOverview fields."""
+    total_completions: int = 0
+    today_completions: int = 0
+    active_streaks: int = 0
+    total_current_streak: int = 0
+
+class CompletionResult(BaseModel):
+    message: str
+    habit_id: str
+    completion_date: str
+    completed: bool
+    # The habit's statistics after the change, with current_streak as of today
+    current_streak: int
+    longest_streak: int
+    completion_count: int
+    last_completion_date: Optional[str] = None
+    stats_delta: StatsDelta
+
+class BulkCompletionItem(HabitCompletionCreate):
+    habit_id: str
+    completed: bool = True  # False removes the completion
+
+class BulkCompletionRequest(BaseModel):
+    items: List[BulkCompletionItem] = Field(..., min_length=1, max_length=1000)
+
+class BulkCompletionResult(BaseModel):
+    habit_id: str
+    completion_date: str
+    completed: bool
+    # completed, uncompleted, already_completed, not_completed, future_date or habit_not_found
+    status: str
+
+class BulkCompletionResponse(BaseModel):
+    results: List[BulkCompletionResult]
+
+class CompletionPage(BaseModel):
+    completions: List[HabitCompletion]
+    next_cursor: Optional[str] = None
+
+# Import Models
+class ImportRowError(BaseModel):
+    line: int
+    message: str
+
+class ImportJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    filename: Optional[str] = None
+    format: str
+    status: str = "running"  # running, completed or failed
+    rows_read: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    habits_created: int = 0
+    errors: List[ImportRowError] = []  # first IMPORT_MAX_ERRORS invalid rows
+    detail: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
 # Statistics Models
 class StatsOverview(BaseModel):
     total_habits: int
@@ -89,14 +195,53 @@ class StatsOverview(BaseModel):
     avg_completion_rate: float
     this_week_performance: List[dict]
 
+class DashboardData(BaseModel):
+    habits: List[HabitWithStats]
+    overview: StatsOverview
+
 class CalendarData(BaseModel):
     completion_dates: List[str]
     habits_by_date: dict
 
+class DailyCount(BaseModel):
+    date: str
+    completions: int
+
+class DailyCountRange(BaseModel):
+    start: str
+    end: str
+    days: List[DailyCount]  # oldest first, including days without completions
+    total: int
+
+class SyncCompletion(BaseModel):
+    id: str
+    habit_id: str
+    completion_date: str
+    created_at: datetime
+    version: int = 0
+
+class SyncTombstone(BaseModel):
+    kind: str  # "habit" or "completion"; a habit tombstone also covers its completions
+    habit_id: str
+    completion_date: Optional[str] = None
+    version: int
+
+class SyncResponse(BaseModel):
+    version: int  # pass as since on the next sync
+    full: bool  # True when habits and completions are the user's complete state
+    habits: List[Habit]
+    completions: List[SyncCompletion]
+    tombstones: List[SyncTombstone]
+
 # Authentication Models
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+class EventsTicket(BaseModel):
+    ticket: str
+    expires_in: int  # seconds
+
 class TokenData(BaseModel):
-    email: Optional[str] = None
\ No newline at end of file
+    email: Optional[str] = None
+    user_id: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Dict, List
+
+from database import db
+from metrics import PURGED_DOCUMENTS
+
+# Deleting a habit or an account only marks its document with deleted_at,
+# which hides it from every read. A background worker then removes the data in
+# batches of PURGE_BATCH_SIZE, pausing PURGE_BATCH_DELAY_SECONDS between
+# batches so long histories do not monopolize the database. The marked
+# document is removed last, so a purge interrupted by a restart is finished by
+# the next run.
+#
+# Writes already under way when an account or habit is deleted can still land,
+# so a user's deletions are purged only once none of the user's writes are in
+# flight; deleted accounts cannot start new ones.
+#
+# Every API worker runs a purge worker. Purges are idempotent, so workers
+# picking up the same deletion only repeat some deletes.
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_BATCH_DELAY_SECONDS = float(os.getenv("PURGE_BATCH_DELAY_SECONDS", "0.1"))
+PURGE_POLL_SECONDS = float(os.getenv("PURGE_POLL_SECONDS", "60"))
+
+# Query fragments for live and soft-deleted habits and users
+NOT_DELETED = {"deleted_at": None}
+DELETED = {"deleted_at": {"$type": "date"}}
+
+# Collections holding a user's data, purged in this order before the user document
+USER_COLLECTIONS = ("habit_completions", "habits", "daily_rollups", "tombstones", "import_jobs")
+
+logger = logging.getLogger(__name__)
+
+async def deleted_habit_ids(user_id: str) -> List[str]:
+    """Ids of the user's deleted habits whose data may not be purged yet."""
+    return await db.habits.distinct("id", {"user_id": user_id, **DELETED})
+
+async def exclude_deleted_habits(query: Dict) -> Dict:
+    """Narrow a query on one user's completions to live habits."""
+    hidden = await deleted_habit_ids(query["user_id"])
+    if hidden:
+        query["habit_id"] = {"$nin": hidden}
+    return query
+
+async def purge_documents(collection, query: Dict, fields=(), on_batch=None) -> int:
+    """Delete every matching document in throttled batches. Returns the number deleted.
+
+    on_batch, if given, is awaited with each deleted batch, read with `fields`.
+    """
+    purged = 0
+    while True:
+        documents = await collection.find(
+            query, {"_id": 1, **{field: 1 for field in fields}}
+        ).limit(PURGE_BATCH_SIZE).to_list(None)
+        if not documents:
+            return purged
+        result = await collection.delete_many({"_id": {"$in": [document["_id"] for document in documents]}})
+        purged += result.deleted_count
+        PURGED_DOCUMENTS.labels(collection.name).inc(result.deleted_count)
+        if on_batch is not None:
+            await on_batch(documents)
+        if len(documents) < PURGE_BATCH_SIZE:
+            return purged
+        await asyncio.sleep(PURGE_BATCH_DELAY_SECONDS)
+
+async def purge_habit(habit_doc: Dict):
+    # rollups imports this module
+    from rollups import apply_rollup_delta
+    
+    # The delete took the completions it counted out of the daily rollups, and
+    # recorded them in rollups_removed. Each purged completion is crossed off
+    # there; what is left over comes from check-ins that landed after the count
+    # (negative) or completions removed after it (positive), and is settled last.
+    settle = "rollups_removed" in habit_doc
+    async def cross_off(completions):
+        if settle:
+            purged_by_date = Counter(completion["completion_date"] for completion in completions)
+            await db.habits.update_one(
+                {"id": habit_doc["id"]},
+                {"$inc": {f"rollups_removed.{day}": -count for day, count in purged_by_date.items()}}
+            )
+    await purge_documents(
+        db.habit_completions, {"user_id": habit_doc["user_id"], "habit_id": habit_doc["id"]},
+        ("completion_date",), cross_off
+    )
+    if settle:
+        # Cleared before it is applied, so a purge interrupted here cannot apply it twice
+        before = await db.habits.find_one_and_update(
+            {"id": habit_doc["id"], **DELETED}, {"$set": {"rollups_removed": {}}}
+        )
+        if before is not None:
+            await apply_rollup_delta(habit_doc["user_id"], before.get("rollups_removed") or {})
+    await db.habits.delete_one({"id": habit_doc["id"], **DELETED})
+
+async def purge_user(user_doc: Dict):
+    for name in USER_COLLECTIONS:
+        await purge_documents(db[name], {"user_id": user_doc["id"]})
+    await db.users.delete_one({"id": user_doc["id"], **DELETED})
+
+async def purge_deleted() -> int:
+    """Purge every soft-deleted account and habit. Returns how many were purged."""
+    # sync imports this module
+    from sync import has_writes_in_flight
+    
+    # Pending deletions are few; reading them up front avoids holding cursors open while throttling.
+    # Deletions whose user is still writing are left for the next run.
+    purged = 0
+    users = await db.users.find(DELETED, {"_id": 0, "id": 1}).to_list(None)
+    for user_doc in users:
+        if not await has_writes_in_flight(user_doc["id"]):
+            await purge_user(user_doc)
+            purged += 1
+    habits = await db.habits.find(DELETED, {"_id": 0, "id": 1, "user_id": 1, "rollups_removed": 1}).to_list(None)
+    for habit_doc in habits:
+        if not await has_writes_in_flight(habit_doc["user_id"]):
+            await purge_habit(habit_doc)
+            purged += 1
+    return purged
+
+class PurgeWorker:
+    """Runs purges in the background: right after a deletion, and every poll interval as a fallback."""
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def wake(self):
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                purged = await purge_deleted()
+                if purged:
+                    logger.info("Purged %d deleted habits and accounts", purged)
+            except Exception:
+                logger.exception("Purge of deleted data failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+purge_worker = PurgeWorker(PURGE_POLL_SECONDS)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Recompute the streak statistics stored on habit documents.
+
+Used to backfill habits created before the statistics were tracked, or to
+repair them after a migration. Habits are processed in batches: one query for
+the batch's completions, one vectorized streak computation and one bulk write.
+
+With --rollups, also rebuilds the per-day completion counts in daily_rollups.
+
+With --dedupe, first deletes repeated completions of a habit on the same day,
+keeping one of each. Run it when the API fails to start because the unique
+completion index cannot be built; it implies --rollups.
+
+Usage:
+    python recompute_stats.py [--user-id USER_ID] [--batch-size 500] [--missing-only] [--rollups] [--dedupe]
+"""
+
+import argparse
+import asyncio
+import logging
+
+from pymongo import UpdateOne
+
+from database import client, db
+from rollups import rebuild_daily_rollups
+from streak_engine import batch_summaries
+
+logger = logging.getLogger(__name__)
+
+EMPTY_STATS = {
+    "current_streak": 0,
+    "longest_streak": 0,
+    "last_completion_date": None,
+    "completion_count": 0
+}
+
+async def remove_duplicate_completions(user_id=None):
+    """Delete all but one completion per habit and day. Returns the number deleted."""
+    match = {"user_id": user_id} if user_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "habit_id": "$habit_id", "completion_date": "$completion_date"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    removed = 0
+    async for group in db.habit_completions.aggregate(pipeline, allowDiskUse=True):
+        result = await db.habit_completions.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    return removed
+
+async def recompute_batch(habits):
+    habit_ids = [habit["id"] for habit in habits]
+    habit_column = []
+    date_column = []
+    # user_id leads every completions index; without it this would scan the collection
+    cursor = db.habit_completions.find(
+        {"user_id": {"$in": list({habit["user_id"] for habit in habits})}, "habit_id": {"$in": habit_ids}},
+        {"habit_id": 1, "completion_date": 1, "_id": 0}
+    )
+    async for completion in cursor:
+        habit_column.append(completion["habit_id"])
+        date_column.append(completion["completion_date"])
+
+    summaries = batch_summaries(habit_column, date_column)
+    await db.habits.bulk_write(
+        [UpdateOne({"id": habit_id}, {"$set": summaries.get(habit_id, EMPTY_STATS)}) for habit_id in habit_ids],
+        ordered=False
+    )
+
+async def recompute_all(user_id=None, batch_size=500, missing_only=False):
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if missing_only:
+        query["completion_count"] = {"$exists": False}
+
+    processed = 0
+    batch = []
+    # In user order, so each batch's completions come from few users
+    async for habit in db.habits.find(query, {"id": 1, "user_id": 1, "_id": 0}).sort("user_id", 1):
+        batch.append(habit)
+        if len(batch) >= batch_size:
+            await recompute_batch(batch)
+            processed += len(batch)
+            logger.info("Recomputed statistics for %d habits", processed)
+            batch = []
+    if batch:
+        await recompute_batch(batch)
+        processed += len(batch)
+    logger.info("Done, recomputed statistics for %d habits", processed)
+    return processed
+
+async def main(args):
+    try:
+        if args.dedupe:
+            removed = await remove_duplicate_completions(args.user_id)
+            logger.info("Removed %d duplicate completions", removed)
+        await recompute_all(args.user_id, args.batch_size, args.missing_only and not args.dedupe)
+        if args.rollups or args.dedupe:
+            written = await rebuild_daily_rollups(args.user_id)
+            logger.info("Rebuilt %d daily rollups", written)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", help="only recompute this user's habits")
+    parser.add_argument("--batch-size", type=int, default=500, help="habits per batch")
+    parser.add_argument("--missing-only", action="store_true", help="skip habits that already have statistics")
+    parser.add_argument("--rollups", action="store_true", help="also rebuild daily completion rollups")
+    parser.add_argument("--dedupe", action="store_true", help="first remove duplicate completions (implies --rollups)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from database import db, stats_db
+from purge import DELETED
+
+# Per-user, per-day completion counts, kept in the daily_rollups collection:
+#   {"user_id": ..., "date": "YYYY-MM-DD", "completions": <int>}
+#
+# Every write to habit_completions applies its net change per day here, so
+# charts over any range read one small document per day instead of scanning
+# completions. Histories written before rollups existed are backfilled with
+# `python recompute_stats.py --rollups`.
+
+def count_by_date(completion_dates: Iterable[str], sign: int = 1) -> Dict[str, int]:
+    """Rollup delta for completions added (sign=1) or removed (sign=-1) on these dates."""
+    return {completion_date: sign * count for completion_date, count in Counter(completion_dates).items()}
+
+def merge_deltas(*deltas: Dict[str, int]) -> Dict[str, int]:
+    merged = Counter()
+    for delta in deltas:
+        merged.update(delta)
+    return dict(merged)
+
+async def apply_rollup_delta(user_id: str, delta: Dict[str, int], session=None):
+    """Add per-day completion count changes to a user's rollups in one round trip."""
+    operations = [
+        UpdateOne({"user_id": user_id, "date": day}, {"$inc": {"completions": change}}, upsert=True)
+        for day, change in delta.items() if change
+    ]
+    if operations:
+        await db.daily_rollups.bulk_write(operations, ordered=False, session=session)
+
+async def count_completions_by_date(match: Dict, session=None) -> Dict[str, int]:
+    """Completions matching the query, counted per day on the server."""
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$completion_date", "completions": {"$sum": 1}}},
+    ]
+    return {
+        group["_id"]: group["completions"]
+        async for group in db.habit_completions.aggregate(pipeline, session=session)
+    }
+
+async def get_daily_counts(user_id: str, start: str, end: str, source_db=stats_db) -> Dict[str, int]:
+    """Completion counts keyed by date for start..end (inclusive); days without completions are omitted.
+
+    Reads follow MONGO_STATS_READ_PREFERENCE; pass source_db=db for results that get cached.
+    """
+    counts = {}
+    async for rollup in source_db.daily_rollups.find(
+        {"user_id": user_id, "date": {"$gte": start, "$lte": end}},
+        {"date": 1, "completions": 1, "_id": 0}
+    ):
+        if rollup["completions"] > 0:
+            counts[rollup["date"]] = rollup["completions"]
+    return counts
+
+def date_range(end: str, days: int) -> List[str]:
+    """The `days` dates ending at end, oldest first."""
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    return [(end_date - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days - 1, -1, -1)]
+
+async def rebuild_daily_rollups(user_id: Optional[str] = None) -> int:
+    """Recompute rollups from habit_completions, for one user or everyone. Returns the documents written.
+
+    Meant for backfills and repairs while the user is not writing; check-ins that
+    land during the rebuild of their user can be overwritten.
+    """
+    match = {"user_id": user_id} if user_id else {}
+    # Completions of deleted habits waiting to be purged were already subtracted
+    deleted = await db.habits.distinct("id", {**match, **DELETED})
+    pipeline = [
+        {"$match": {**match, "habit_id": {"$nin": deleted}} if deleted else match},
+        {"$group": {"_id": {"user_id": "$user_id", "date": "$completion_date"}, "completions": {"$sum": 1}}},
+    ]
+    await db.daily_rollups.delete_many(match)
+    written = 0
+    operations = []
+    async for group in db.habit_completions.aggregate(pipeline, allowDiskUse=True):
+        operations.append(UpdateOne(
+            {"user_id": group["_id"]["user_id"], "date": group["_id"]["date"]},
+            {"$set": {"completions": group["completions"]}},
+            upsert=True
+        ))
+        if len(operations) >= 1000:
+            await db.daily_rollups.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+    if operations:
+        await db.daily_rollups.bulk_write(operations, ordered=False)
+        written += len(operations)
+    return written
@@ -1,31 +1,57 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer
+from fastapi import FastAPI, APIRouter, Depends, File, Form, Header, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+import orjson
 import os
+import asyncio
 import logging
+import calendar
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 
 # Import database connection
-from database import db, client
+from database import db, stats_db, client, ensure_indexes, run_in_transaction
 
 # Import models and functions
 from models import (
-    User, UserCreate, UserLogin, UserResponse,
+    User, UserCreate, UserLogin, UserResponse, UserSettingsUpdate,
     Habit, HabitCreate, HabitUpdate, HabitWithStats,
-    HabitCompletion, HabitCompletionCreate,
-    StatsOverview, CalendarData, Token
+    HabitCompletion, HabitCompletionCreate, CompletionPage, CompletionResult, StatsDelta,
+    BulkCompletionRequest, BulkCompletionResult, BulkCompletionResponse,
+    ImportJob, ImportRowError, StatsOverview, DashboardData, CalendarData, DailyCount, DailyCountRange,
+    SyncCompletion, SyncTombstone, SyncResponse, Token, EventsTicket, check_timezone
 )
 from auth import (
-    authenticate_user, create_access_token, get_current_user,
-    get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
+    authenticate_user, create_access_token, get_current_user, get_user_from_token, invalidate_cached_user,
+    get_password_hash_async, create_events_ticket, get_user_from_events_ticket, security,
+    ACCESS_TOKEN_EXPIRE_MINUTES, EVENTS_TICKET_EXPIRE_SECONDS
 )
-from utils import calculate_streaks, get_week_performance, get_completion_rate
+from utils import (
+    get_week_performance, get_completion_rate, CompletionStatsAccumulator, DateContext,
+    accumulate_completions, apply_completion_to_stats, apply_uncompletion_to_stats, current_streak_as_of
+)
+from cache import response_cache
+from rollups import (
+    apply_rollup_delta, count_by_date, count_completions_by_date, date_range, get_daily_counts, merge_deltas
+)
+from export import EXPORTERS, EXPORT_FORMATS
+from importer import IMPORT_MAX_BYTES, IMPORT_MAX_ERRORS, detect_format, iter_chunks, spool_upload
+from instrumentation import InstrumentationMiddleware
+from metrics import render_prometheus
+from events import ACCOUNT_DELETED_EVENT, CLIENT_ID_HEADER, event_hub
+from purge import NOT_DELETED, exclude_deleted_habits, purge_worker
+from sync import add_tombstones, changes_since, committed_sync_version, sync_write
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -42,11 +68,12 @@ async def register(user_data: UserCreate):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     user = User(
         name=user_data.name,
         email=user_data.email,
-        password_hash=hashed_password
+        password_hash=hashed_password,
+        timezone=user_data.timezone
     )
     
     await db.users.insert_one(user.dict())
@@ -63,7 +90,7 @@ async def login(user_data: UserLogin):
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -71,66 +98,300 @@ async def login(user_data: UserLogin):
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return UserResponse(**current_user.dict())
 
-# Habit management endpoints
-@api_router.get("/habits", response_model=List[HabitWithStats])
-async def get_habits(current_user: User = Depends(get_current_user)):
-    habits = await db.habits.find({"user_id": current_user.id}).to_list(100)
-    habits_with_stats = []
+@api_router.put("/auth/me/settings", response_model=UserResponse)
+async def update_user_settings(
+    settings: UserSettingsUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    # Only fields sent are changed; timezone null means server-local time
+    update_data = settings.model_dump(exclude_unset=True)
+    if update_data.get("theme", "") is None:
+        del update_data["theme"]
+    if update_data:
+        await db.users.update_one({"id": current_user.id}, {"$set": update_data})
+        invalidate_cached_user(current_user)
+        # Cached responses were built for the old timezone's "today"
+        await response_cache.invalidate(current_user.id)
+    return UserResponse(**{**current_user.dict(), **update_data})
+
+@api_router.delete("/auth/me")
+async def delete_account(current_user: User = Depends(get_current_user)):
+    # Hide the account and its habits now; the purge worker deletes all of
+    # the user's data in the background, the user document last
+    deleted_at = datetime.utcnow()
+    async def soft_delete(session):
+        await db.users.update_one({"id": current_user.id}, {"$set": {"deleted_at": deleted_at}}, session=session)
+        await db.habits.update_many(
+            {"user_id": current_user.id, **NOT_DELETED}, {"$set": {"deleted_at": deleted_at}}, session=session
+        )
     
+    await run_in_transaction(soft_delete)
+    purge_worker.wake()
+    invalidate_cached_user(current_user)
+    await response_cache.invalidate(current_user.id)
+    # Closes the account's open event streams, in every worker
+    await event_hub.publish(current_user.id, {"type": ACCOUNT_DELETED_EVENT})
+    return {"message": "Account deleted successfully"}
+
+# Browsers send their IANA timezone, used for accounts that have none stored
+TIMEZONE_HEADER = "X-Timezone"
+
+def client_timezone(value: Optional[str]) -> Optional[str]:
+    """The timezone sent in the header, or None when missing or unknown."""
+    try:
+        return check_timezone(value)
+    except ValueError:
+        return None
+
+async def get_date_context(
+    timezone: Optional[str] = Header(None, alias=TIMEZONE_HEADER),
+    current_user: User = Depends(get_current_user)
+) -> DateContext:
+    """Today, yesterday and the week window in the user's timezone, resolved once per request."""
+    return DateContext.for_timezone(current_user.timezone or client_timezone(timezone))
+
+# completed_dates in habit responses defaults to this many most recent days
+COMPLETED_DATES_WINDOW_DAYS = int(os.getenv("COMPLETED_DATES_WINDOW_DAYS", "90"))
+# Documents fetched per round trip when streaming completions, which bounds
+# the memory a single request holds at once
+COMPLETION_CURSOR_BATCH_SIZE = int(os.getenv("COMPLETION_CURSOR_BATCH_SIZE", "1000"))
+COMPLETION_PROJECTION = {"habit_id": 1, "completion_date": 1, "_id": 0}
+
+def parse_date_param(value: Optional[str], name: str) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a YYYY-MM-DD date")
+    return value
+
+def completed_dates_window(
+    since: Optional[str],
+    until: Optional[str],
+    date_context: DateContext
+) -> Tuple[str, Optional[str]]:
+    """Validate since/until query parameters, defaulting to the recent window."""
+    since = parse_date_param(since, "since")
+    until = parse_date_param(until, "until")
+    if since is None:
+        window_start = date_context.today - timedelta(days=COMPLETED_DATES_WINDOW_DAYS - 1)
+        since = window_start.strftime("%Y-%m-%d")
+    return since, until
+
+async def get_completed_dates_by_habit(
+    user_id: str,
+    habit_ids: List[str],
+    since: Optional[str] = None,
+    until: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """Load completion dates for many habits in one aggregation, grouped by habit_id.
+    
+    since/until optionally limit the dates returned (inclusive, YYYY-MM-DD).
+    """
+    if not habit_ids:
+        return {}
+    
+    match = {"user_id": user_id, "habit_id": {"$in": habit_ids}}
+    if since or until:
+        match["completion_date"] = {}
+        if since:
+            match["completion_date"]["$gte"] = since
+        if until:
+            match["completion_date"]["$lte"] = until
+    
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$habit_id", "completed_dates": {"$push": "$completion_date"}}},
+    ]
+    completed_dates_by_habit = {}
+    async for group in db.habit_completions.aggregate(pipeline):
+        completed_dates_by_habit[group["_id"]] = group["completed_dates"]
+    return completed_dates_by_habit
+
+# Stored habit streak statistics
+HABIT_STATS_FIELDS = ("current_streak", "longest_streak", "last_completion_date", "completion_count")
+
+def has_habit_stats(habit_doc: Dict) -> bool:
+    return all(field in habit_doc for field in HABIT_STATS_FIELDS)
+
+def with_version(stats: Dict, version: Optional[int]) -> Dict:
+    """Stats to $set, stamped with the sync version of the write that changed them."""
+    return stats if version is None else {**stats, "version": version}
+
+async def recompute_habit_stats(habit_doc: Dict, version: Optional[int] = None) -> Dict:
+    """Rebuild a habit's stored streak statistics from its full completion history."""
+    accumulator = CompletionStatsAccumulator()
+    cursor = db.habit_completions.find(
+        {"habit_id": habit_doc["id"], "user_id": habit_doc["user_id"]},
+        COMPLETION_PROJECTION
+    ).sort("completion_date", 1).batch_size(COMPLETION_CURSOR_BATCH_SIZE)
+    while completions := await cursor.to_list(COMPLETION_CURSOR_BATCH_SIZE):
+        accumulate_completions({habit_doc["id"]: accumulator}, completions)
+    stats = accumulator.stats()
+    await db.habits.update_one({"id": habit_doc["id"]}, {"$set": with_version(stats, version)})
+    habit_doc.update(stats)
+    return stats
+
+async def update_habit_stats(habit_doc: Dict, stats: Optional[Dict], version: Optional[int] = None) -> Dict:
+    """Store incrementally updated streak statistics, falling back to a full recompute."""
+    if stats is None or not has_habit_stats(habit_doc):
+        return await recompute_habit_stats(habit_doc, version)
+    
+    # Only apply the increment on top of the statistics it was computed from;
+    # a concurrent check-in for the same habit forces a recompute instead
+    result = await db.habits.update_one(
+        {"id": habit_doc["id"], **{field: habit_doc[field] for field in HABIT_STATS_FIELDS}},
+        {"$set": with_version(stats, version)}
+    )
+    if result.matched_count == 0:
+        return await recompute_habit_stats(habit_doc, version)
+    habit_doc.update(stats)
+    return stats
+
+async def store_habit_stats(habits: List[Dict], version: Optional[int] = None):
+    """Recompute and store streak statistics for several habits of one user at once."""
+    if not habits:
+        return
+    
+    # Stream the histories in index order and fold each into its habit's accumulator,
+    # one cursor batch at a time so the streak metrics time the folding. Memory stays
+    # bounded here; streak_engine.batch_summaries needs whole histories and serves
+    # the offline recompute instead.
+    accumulators = {habit_doc["id"]: CompletionStatsAccumulator() for habit_doc in habits}
+    cursor = db.habit_completions.find(
+        {"user_id": habits[0]["user_id"], "habit_id": {"$in": list(accumulators)}},
+        COMPLETION_PROJECTION
+    ).sort([("habit_id", 1), ("completion_date", 1)]).batch_size(COMPLETION_CURSOR_BATCH_SIZE)
+    while completions := await cursor.to_list(COMPLETION_CURSOR_BATCH_SIZE):
+        accumulate_completions(accumulators, completions)
+    
+    summaries = {habit_id: accumulator.stats() for habit_id, accumulator in accumulators.items()}
+    await db.habits.bulk_write(
+        [UpdateOne({"id": habit_id}, {"$set": with_version(stats, version)}) for habit_id, stats in summaries.items()],
+        ordered=False
+    )
     for habit_doc in habits:
-        habit = Habit(**habit_doc)
-        
-        # Get completions for this habit
-        completions = await db.habit_completions.find({
-            "habit_id": habit.id,
-            "user_id": current_user.id
-        }).to_list(1000)
-        
-        completed_dates = [comp["completion_date"] for comp in completions]
-        current_streak, longest_streak = calculate_streaks(completed_dates)
-        
-        habit_with_stats = HabitWithStats(
-            **habit.dict(),
-            current_streak=current_streak,
-            longest_streak=longest_streak,
-            completion_count=len(completed_dates),
-            completed_dates=completed_dates
-        )
-        habits_with_stats.append(habit_with_stats)
+        habit_doc.update(summaries[habit_doc["id"]])
+
+async def backfill_habit_stats(habits: List[Dict]):
+    """Store streak statistics on habits created before they were tracked."""
+    await store_habit_stats([habit_doc for habit_doc in habits if not has_habit_stats(habit_doc)])
+
+def build_habit_with_stats(habit_doc: Dict, completed_dates: List[str], date_context: DateContext) -> HabitWithStats:
+    # Habit documents are only ever written from validated models, so they are
+    # trusted here instead of being validated again on every read
+    return HabitWithStats.model_construct(**{
+        **habit_doc,
+        "current_streak": current_streak_as_of(habit_doc, date_context),
+        "completed_dates": completed_dates
+    })
+
+def _json_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dump_json(value) -> bytes:
+    """Serialize models, or containers of them, straight to JSON bytes."""
+    return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+# Cached responses for the dashboard reads, invalidated by every write.
+# Builds read from the primary: a lagging secondary could hand back the state
+# from before the write that just invalidated the entry, and it would stay cached.
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def cached_json_response(request: Request, user_id: str, key: str, build) -> Response:
+    etag, body = await response_cache.get_or_build(
+        user_id, key, build, dump_json
+    )
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Habit management endpoints
+async def list_habits_with_stats(
+    user_id: str,
+    since: str,
+    until: Optional[str],
+    date_context: DateContext
+) -> List[HabitWithStats]:
+    habits = [habit_doc async for habit_doc in db.habits.find({"user_id": user_id, **NOT_DELETED}, {"_id": 0})]
     
-    return habits_with_stats
+    # Get completions for all habits in a single round trip
+    completed_dates_by_habit = await get_completed_dates_by_habit(
+        user_id, [habit_doc["id"] for habit_doc in habits], since, until
+    )
+    await backfill_habit_stats(habits)
+    
+    return [
+        build_habit_with_stats(habit_doc, completed_dates_by_habit.get(habit_doc["id"], []), date_context)
+        for habit_doc in habits
+    ]
+
+@api_router.get("/habits", response_model=List[HabitWithStats])
+async def get_habits(
+    request: Request,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    since, until = completed_dates_window(since, until, date_context)
+    # Streaks depend on the current day, so it is part of the key
+    return await cached_json_response(
+        request, current_user.id, f"habits:{date_context.today_str}:{since}:{until}",
+        lambda: list_habits_with_stats(current_user.id, since, until, date_context)
+    )
 
 @api_router.post("/habits", response_model=HabitWithStats)
 async def create_habit(
     habit_data: HabitCreate,
-    current_user: User = Depends(get_current_user)
+    client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
 ):
-    habit = Habit(
-        user_id=current_user.id,
-        **habit_data.dict()
-    )
-    
-    await db.habits.insert_one(habit.dict())
+    async with sync_write(current_user.id) as version:
+        habit = Habit(
+            user_id=current_user.id,
+            version=version,
+            **habit_data.dict()
+        )
+        
+        habit_doc = habit.dict()
+        await db.habits.insert_one(habit_doc)
+    await response_cache.invalidate(current_user.id)
     
     # Return habit with empty stats (new habit)
-    return HabitWithStats(
-        **habit.dict(),
-        current_streak=0,
-        longest_streak=0,
-        completion_count=0,
-        completed_dates=[]
-    )
+    habit_with_stats = build_habit_with_stats(habit_doc, [], date_context)
+    await event_hub.publish(current_user.id, {
+        "type": "habit.created", "habit_id": habit.id, "version": habit.version, "habit": habit_with_stats.dict()
+    }, client_id)
+    return habit_with_stats
 
 @api_router.put("/habits/{habit_id}", response_model=HabitWithStats)
 async def update_habit(
     habit_id: str,
     habit_update: HabitUpdate,
-    current_user: User = Depends(get_current_user)
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
 ):
+    since, until = completed_dates_window(since, until, date_context)
+    
     # Verify habit belongs to user
     habit_doc = await db.habits.find_one({
         "id": habit_id,
-        "user_id": current_user.id
+        "user_id": current_user.id,
+        **NOT_DELETED
     })
     if not habit_doc:
         raise HTTPException(status_code=404, detail="Habit not found")
@@ -138,117 +399,350 @@ async def update_habit(
     # Update habit
     update_data = {k: v for k, v in habit_update.dict().items() if v is not None}
     if update_data:
-        await db.habits.update_one(
-            {"id": habit_id},
-            {"$set": update_data}
-        )
+        async with sync_write(current_user.id) as version:
+            update_data["version"] = version
+            await db.habits.update_one(
+                {"id": habit_id},
+                {"$set": update_data}
+            )
+        await response_cache.invalidate(current_user.id)
     
     # Get updated habit with stats
     updated_habit = await db.habits.find_one({"id": habit_id})
-    completions = await db.habit_completions.find({
-        "habit_id": habit_id,
-        "user_id": current_user.id
-    }).to_list(1000)
-    
-    completed_dates = [comp["completion_date"] for comp in completions]
-    current_streak, longest_streak = calculate_streaks(completed_dates)
-    
-    return HabitWithStats(
-        **updated_habit,
-        current_streak=current_streak,
-        longest_streak=longest_streak,
-        completion_count=len(completed_dates),
-        completed_dates=completed_dates
+    completed_dates_by_habit = await get_completed_dates_by_habit(
+        current_user.id, [habit_id], since, until
     )
+    await backfill_habit_stats([updated_habit])
+    
+    habit_with_stats = build_habit_with_stats(updated_habit, completed_dates_by_habit.get(habit_id, []), date_context)
+    if update_data:
+        # completed_dates follow this request's window, so other sessions keep their own
+        await event_hub.publish(current_user.id, {
+            "type": "habit.updated", "habit_id": habit_id, "version": update_data["version"],
+            "habit": habit_with_stats.dict(exclude={"completed_dates"})
+        }, client_id)
+    return habit_with_stats
 
 @api_router.delete("/habits/{habit_id}")
 async def delete_habit(
     habit_id: str,
+    client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
     current_user: User = Depends(get_current_user)
 ):
     # Verify habit belongs to user
     habit_doc = await db.habits.find_one({
         "id": habit_id,
-        "user_id": current_user.id
+        "user_id": current_user.id,
+        **NOT_DELETED
     })
     if not habit_doc:
         raise HTTPException(status_code=404, detail="Habit not found")
     
-    # Delete habit and all its completions
-    await db.habits.delete_one({"id": habit_id})
-    await db.habit_completions.delete_many({"habit_id": habit_id})
+    # Hide the habit and take its completions out of the daily rollups together;
+    # the purge worker deletes the completions themselves in the background
+    async def soft_delete(session):
+        counts = await count_completions_by_date({"user_id": current_user.id, "habit_id": habit_id}, session)
+        # What was taken out of the rollups is kept, so the purge can settle check-ins
+        # that land while the habit is being deleted
+        result = await db.habits.update_one(
+            {"id": habit_id, **NOT_DELETED},
+            {"$set": {"deleted_at": datetime.utcnow(), "version": version, "rollups_removed": counts}},
+            session=session
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Habit not found")
+        await apply_rollup_delta(current_user.id, {day: -count for day, count in counts.items()}, session)
+        await add_tombstones(current_user.id, version, habit_ids=[habit_id], session=session)
+    
+    async with sync_write(current_user.id) as version:
+        await run_in_transaction(soft_delete)
+    purge_worker.wake()
+    await response_cache.invalidate(current_user.id)
+    await event_hub.publish(current_user.id, {"type": "habit.deleted", "habit_id": habit_id, "version": version}, client_id)
     
     return {"message": "Habit deleted successfully"}
 
 # Habit completion endpoints
-@api_router.post("/habits/{habit_id}/complete")
-async def complete_habit(
+@api_router.get("/habits/{habit_id}/completions", response_model=CompletionPage)
+async def get_habit_completions(
     habit_id: str,
-    completion_data: HabitCompletionCreate,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_user)
 ):
+    # Full completion history, newest first; next_cursor is passed back as cursor
     # Verify habit belongs to user
     habit_doc = await db.habits.find_one({
         "id": habit_id,
-        "user_id": current_user.id
+        "user_id": current_user.id,
+        **NOT_DELETED
     })
     if not habit_doc:
         raise HTTPException(status_code=404, detail="Habit not found")
     
-    # Check if already completed for this date
-    existing_completion = await db.habit_completions.find_one({
-        "habit_id": habit_id,
+    query = {"user_id": current_user.id, "habit_id": habit_id}
+    if cursor:
+        query["completion_date"] = {"$lt": parse_date_param(cursor, "cursor")}
+    
+    # Fetch one extra document to know whether another page exists
+    completions = await db.habit_completions.find(query, {"_id": 0}).sort(
+        "completion_date", -1
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(completions) > limit:
+        completions = completions[:limit]
+        next_cursor = completions[-1]["completion_date"]
+    
+    return CompletionPage(completions=completions, next_cursor=next_cursor)
+
+def build_completion_result(
+    habit_doc: Dict,
+    completion_date: str,
+    completed: bool,
+    streak_before: int,
+    date_context: DateContext,
+    message: str
+) -> CompletionResult:
+    """The habit's new statistics and how the overview changed, so clients can patch local state."""
+    streak_after = current_streak_as_of(habit_doc, date_context)
+    change = 1 if completed else -1
+    return CompletionResult(
+        message=message,
+        habit_id=habit_doc["id"],
+        completion_date=completion_date,
+        completed=completed,
+        current_streak=streak_after,
+        longest_streak=habit_doc["longest_streak"],
+        completion_count=habit_doc["completion_count"],
+        last_completion_date=habit_doc["last_completion_date"],
+        stats_delta=StatsDelta(
+            total_completions=change,
+            today_completions=change if completion_date == date_context.today_str else 0,
+            active_streaks=int(streak_after > 0) - int(streak_before > 0),
+            total_current_streak=streak_after - streak_before
+        )
+    )
+
+@api_router.post("/habits/{habit_id}/complete", response_model=CompletionResult)
+async def complete_habit(
+    habit_id: str,
+    completion_data: HabitCompletionCreate,
+    client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    # "Today" is the user's day, so a client clock in another zone cannot check in ahead of it
+    if completion_data.completion_date > date_context.latest_date_str:
+        raise HTTPException(status_code=400, detail="Completion date cannot be in the future")
+    
+    # Verify habit belongs to user
+    habit_doc = await db.habits.find_one({
+        "id": habit_id,
         "user_id": current_user.id,
-        "completion_date": completion_data.completion_date
+        **NOT_DELETED
     })
+    if not habit_doc:
+        raise HTTPException(status_code=404, detail="Habit not found")
+    await backfill_habit_stats([habit_doc])
+    streak_before = current_streak_as_of(habit_doc, date_context)
     
-    if existing_completion:
-        raise HTTPException(
-            status_code=400,
-            detail="Habit already completed for this date"
+    async with sync_write(current_user.id) as version:
+        # Create completion record; the unique index rejects duplicates for this date
+        completion = HabitCompletion(
+            habit_id=habit_id,
+            user_id=current_user.id,
+            completion_date=completion_data.completion_date,
+            version=version
         )
-    
-    # Create completion record
-    completion = HabitCompletion(
-        habit_id=habit_id,
-        user_id=current_user.id,
-        completion_date=completion_data.completion_date
+        
+        try:
+            await db.habit_completions.insert_one(completion.dict())
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=400,
+                detail="Habit already completed for this date"
+            )
+        
+        # Independent documents, so written concurrently
+        await asyncio.gather(
+            apply_rollup_delta(current_user.id, {completion_data.completion_date: 1}),
+            update_habit_stats(habit_doc, apply_completion_to_stats(habit_doc, completion_data.completion_date), version)
+        )
+    await response_cache.invalidate(current_user.id)
+    result = build_completion_result(
+        habit_doc, completion_data.completion_date, True, streak_before, date_context,
+        "Habit marked as completed"
     )
-    
-    await db.habit_completions.insert_one(completion.dict())
-    return {"message": "Habit marked as completed"}
+    await event_hub.publish(current_user.id, {
+        "type": "completion.created", "habit_id": habit_id,
+        "completion_date": completion_data.completion_date, "version": version, "result": result.dict()
+    }, client_id)
+    return result
 
-@api_router.delete("/habits/{habit_id}/complete/{completion_date}")
+@api_router.delete("/habits/{habit_id}/complete/{completion_date}", response_model=CompletionResult)
 async def uncomplete_habit(
     habit_id: str,
     completion_date: str,
-    current_user: User = Depends(get_current_user)
+    client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
 ):
     # Verify habit belongs to user
     habit_doc = await db.habits.find_one({
         "id": habit_id,
-        "user_id": current_user.id
+        "user_id": current_user.id,
+        **NOT_DELETED
     })
     if not habit_doc:
         raise HTTPException(status_code=404, detail="Habit not found")
+    await backfill_habit_stats([habit_doc])
+    streak_before = current_streak_as_of(habit_doc, date_context)
     
-    # Delete completion record
-    result = await db.habit_completions.delete_one({
-        "habit_id": habit_id,
-        "user_id": current_user.id,
-        "completion_date": completion_date
-    })
+    async with sync_write(current_user.id) as version:
+        # Delete completion record
+        result = await db.habit_completions.delete_one({
+            "habit_id": habit_id,
+            "user_id": current_user.id,
+            "completion_date": completion_date
+        })
+        
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Completion not found")
+        
+        await asyncio.gather(
+            apply_rollup_delta(current_user.id, {completion_date: -1}),
+            add_tombstones(current_user.id, version, completions=[(habit_id, completion_date)]),
+            update_habit_stats(habit_doc, apply_uncompletion_to_stats(habit_doc, completion_date), version)
+        )
+    await response_cache.invalidate(current_user.id)
+    result = build_completion_result(
+        habit_doc, completion_date, False, streak_before, date_context,
+        "Habit completion removed"
+    )
+    await event_hub.publish(current_user.id, {
+        "type": "completion.deleted", "habit_id": habit_id, "completion_date": completion_date,
+        "version": version, "result": result.dict()
+    }, client_id)
+    return result
+
+@api_router.post("/completions/bulk", response_model=BulkCompletionResponse)
+async def bulk_update_completions(
+    bulk_data: BulkCompletionRequest,
+    client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    items = bulk_data.items
+    habit_ids = list({item.habit_id for item in items})
+    
+    # Verify all habits belong to user in one query
+    habits_by_id = {}
+    async for habit_doc in db.habits.find(
+        {"id": {"$in": habit_ids}, "user_id": current_user.id, **NOT_DELETED},
+        {"id": 1, "user_id": 1, "_id": 0}
+    ):
+        habits_by_id[habit_doc["id"]] = habit_doc
+    
+    # Load the current state of every (habit, date) pair touched by the request
+    initial = set()
+    async for completion in db.habit_completions.find(
+        {
+            "user_id": current_user.id,
+            "habit_id": {"$in": list(habits_by_id)},
+            "completion_date": {"$in": list({item.completion_date for item in items})}
+        },
+        COMPLETION_PROJECTION
+    ).batch_size(COMPLETION_CURSOR_BATCH_SIZE):
+        initial.add((completion["habit_id"], completion["completion_date"]))
     
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Completion not found")
+    # Apply items in order to work out each item's result and the net change per pair
+    state = set(initial)
+    results = []
+    last_item_for_pair = {}
+    for index, item in enumerate(items):
+        pair = (item.habit_id, item.completion_date)
+        if item.habit_id not in habits_by_id:
+            item_status = "habit_not_found"
+        elif item.completed and item.completion_date > date_context.latest_date_str:
+            item_status = "future_date"
+        elif item.completed:
+            item_status = "already_completed" if pair in state else "completed"
+            state.add(pair)
+            last_item_for_pair[pair] = index
+        else:
+            item_status = "uncompleted" if pair in state else "not_completed"
+            state.discard(pair)
+            last_item_for_pair[pair] = index
+        results.append(BulkCompletionResult(
+            habit_id=item.habit_id,
+            completion_date=item.completion_date,
+            completed=item.completed,
+            status=item_status
+        ))
+    
+    if state == initial:
+        return BulkCompletionResponse(results=results)
+    
+    # One sync version covers every change the request makes
+    async with sync_write(current_user.id) as version:
+        operations = []
+        operation_items = []
+        inserted_dates = []
+        deleted_dates = []
+        for habit_id, completion_date in state - initial:
+            # Dates were validated with the request body
+            completion = HabitCompletion.model_construct(
+                habit_id=habit_id,
+                user_id=current_user.id,
+                completion_date=completion_date,
+                version=version
+            )
+            operations.append(InsertOne(completion.model_dump()))
+            operation_items.append(last_item_for_pair[(habit_id, completion_date)])
+            inserted_dates.append(completion_date)
+        for habit_id, completion_date in initial - state:
+            operations.append(DeleteOne({
+                "habit_id": habit_id,
+                "user_id": current_user.id,
+                "completion_date": completion_date
+            }))
+            operation_items.append(last_item_for_pair[(habit_id, completion_date)])
+            deleted_dates.append(completion_date)
+        
+        try:
+            await db.habit_completions.bulk_write(operations, ordered=False)
+        except BulkWriteError as error:
+            # Inserts racing with another request hit the unique index
+            for write_error in error.details["writeErrors"]:
+                if write_error["code"] != 11000:
+                    raise
+                results[operation_items[write_error["index"]]].status = "already_completed"
+                # Inserts come first in operations, so the index is into inserted_dates
+                inserted_dates[write_error["index"]] = None
+        
+        await apply_rollup_delta(current_user.id, merge_deltas(
+            count_by_date([day for day in inserted_dates if day is not None]),
+            count_by_date(deleted_dates, -1)
+        ))
+        await add_tombstones(current_user.id, version, completions=initial - state)
+        touched = {habit_id for habit_id, _ in state ^ initial}
+        await store_habit_stats([habits_by_id[habit_id] for habit_id in touched], version)
+    await response_cache.invalidate(current_user.id)
+    await event_hub.publish(
+        current_user.id, {"type": "completions.changed", "habit_ids": sorted(touched), "version": version}, client_id
+    )
     
-    return {"message": "Habit completion removed"}
+    return BulkCompletionResponse(results=results)
 
 # Statistics endpoints
-@api_router.get("/stats/overview", response_model=StatsOverview)
-async def get_stats_overview(current_user: User = Depends(get_current_user)):
-    # Get all user habits
-    habits = await db.habits.find({"user_id": current_user.id}).to_list(100)
+def summarize_overview(
+    habits: List[Dict],
+    current_streaks: List[int],
+    completions_by_date: Dict[str, int],
+    date_context: DateContext
+) -> StatsOverview:
+    """Build the overview from habits with stored stats, their current streaks (in the same order) and the week's rollups."""
     total_habits = len(habits)
     
     if total_habits == 0:
@@ -263,56 +757,380 @@ async def get_stats_overview(current_user: User = Depends(get_current_user)):
             this_week_performance=[]
         )
     
-    # Get all completions for user
-    all_completions = await db.habit_completions.find({
-        "user_id": current_user.id
-    }).to_list(10000)
-    
-    # Calculate stats
-    today = datetime.now().strftime("%Y-%m-%d")
-    today_completions = len([c for c in all_completions if c["completion_date"] == today])
-    
     total_current_streak = 0
     longest_streak_overall = 0
     active_streaks = 0
     total_completion_rate = 0
     
-    habits_data = []
-    for habit in habits:
-        habit_completions = [c for c in all_completions if c["habit_id"] == habit["id"]]
-        completed_dates = [c["completion_date"] for c in habit_completions]
-        
-        current_streak, longest_streak = calculate_streaks(completed_dates)
+    completion_counts = {habit["id"]: habit["completion_count"] for habit in habits}
+    for habit, current_streak in zip(habits, current_streaks):
         total_current_streak += current_streak
-        longest_streak_overall = max(longest_streak_overall, longest_streak)
+        longest_streak_overall = max(longest_streak_overall, habit["longest_streak"])
         
         if current_streak > 0:
             active_streaks += 1
             
-        completion_rate = get_completion_rate(len(completed_dates), habit["target_days"])
+        completion_rate = get_completion_rate(completion_counts.get(habit["id"], 0), habit["target_days"])
         total_completion_rate += completion_rate
-        
-        habits_data.append({
-            "id": habit["id"],
-            "completed_dates": completed_dates,
-            "current_streak": current_streak,
-            "longest_streak": longest_streak
-        })
     
     avg_completion_rate = total_completion_rate / total_habits if total_habits > 0 else 0
-    this_week_performance = get_week_performance(habits_data)
+    this_week_performance = get_week_performance(completions_by_date, date_context.today)
     
     return StatsOverview(
         total_habits=total_habits,
         active_streaks=active_streaks,
         total_current_streak=total_current_streak,
         longest_streak=longest_streak_overall,
-        total_completions=len(all_completions),
-        today_completions=today_completions,
+        total_completions=sum(completion_counts.values()),
+        today_completions=completions_by_date.get(date_context.today_str, 0),
         avg_completion_rate=round(avg_completion_rate, 1),
         this_week_performance=this_week_performance
     )
 
+async def compute_stats_overview(user_id: str, date_context: DateContext) -> StatsOverview:
+    # Per-habit totals come from the stored habit statistics and the last
+    # 7 days from the daily rollups, so no completions are read
+    habits = [
+        habit_doc async for habit_doc in db.habits.find(
+            {"user_id": user_id, **NOT_DELETED},
+            {"_id": 0, "id": 1, "user_id": 1, "target_days": 1, **{field: 1 for field in HABIT_STATS_FIELDS}}
+        )
+    ]
+    if not habits:
+        return summarize_overview([], [], {}, date_context)
+    
+    completions_by_date = await get_daily_counts(
+        user_id, date_context.week_start_str, date_context.today_str, db
+    )
+    await backfill_habit_stats(habits)
+    current_streaks = [current_streak_as_of(habit, date_context) for habit in habits]
+    return summarize_overview(habits, current_streaks, completions_by_date, date_context)
+
+async def compute_dashboard(
+    user_id: str,
+    since: str,
+    until: Optional[str],
+    date_context: DateContext
+) -> DashboardData:
+    """Habits with stats and the overview, from one read of the habits and one streak pass."""
+    habits = [habit_doc async for habit_doc in db.habits.find({"user_id": user_id, **NOT_DELETED}, {"_id": 0})]
+    completed_dates_by_habit, completions_by_date = await asyncio.gather(
+        get_completed_dates_by_habit(user_id, [habit_doc["id"] for habit_doc in habits], since, until),
+        get_daily_counts(user_id, date_context.week_start_str, date_context.today_str, db)
+    )
+    await backfill_habit_stats(habits)
+    
+    habits_with_stats = [
+        build_habit_with_stats(habit_doc, completed_dates_by_habit.get(habit_doc["id"], []), date_context)
+        for habit_doc in habits
+    ]
+    overview = summarize_overview(
+        habits, [habit.current_streak for habit in habits_with_stats], completions_by_date, date_context
+    )
+    return DashboardData.model_construct(habits=habits_with_stats, overview=overview)
+
+@api_router.get("/dashboard", response_model=DashboardData)
+async def get_dashboard(
+    request: Request,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    # GET /api/habits and GET /api/stats/overview in one response
+    since, until = completed_dates_window(since, until, date_context)
+    return await cached_json_response(
+        request, current_user.id, f"dashboard:{date_context.today_str}:{since}:{until}",
+        lambda: compute_dashboard(current_user.id, since, until, date_context)
+    )
+
+@api_router.get("/stats/overview", response_model=StatsOverview)
+async def get_stats_overview(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    return await cached_json_response(
+        request, current_user.id, f"overview:{date_context.today_str}",
+        lambda: compute_stats_overview(current_user.id, date_context)
+    )
+
+@api_router.get("/stats/calendar/{month}/{year}", response_model=CalendarData)
+async def get_calendar_data(
+    month: int,
+    year: int,
+    current_user: User = Depends(get_current_user)
+):
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        raise HTTPException(status_code=400, detail="Invalid month or year")
+    
+    # Only read the month being shown, through the (user_id, completion_date) index
+    days_in_month = calendar.monthrange(year, month)[1]
+    first_day = f"{year:04d}-{month:02d}-01"
+    last_day = f"{year:04d}-{month:02d}-{days_in_month:02d}"
+    habits_by_date = defaultdict(list)
+    async for completion in stats_db.habit_completions.find(
+        await exclude_deleted_habits({
+            "user_id": current_user.id,
+            "completion_date": {"$gte": first_day, "$lte": last_day}
+        }),
+        COMPLETION_PROJECTION
+    ).batch_size(COMPLETION_CURSOR_BATCH_SIZE):
+        habits_by_date[completion["completion_date"]].append(completion["habit_id"])
+    
+    return CalendarData(
+        completion_dates=sorted(habits_by_date),
+        habits_by_date=dict(habits_by_date)
+    )
+
+@api_router.get("/stats/daily", response_model=DailyCountRange)
+async def get_daily_completions(
+    days: int = Query(30, ge=1, le=366),
+    until: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    # Completions per day for the `days` days ending at until (default today)
+    end = parse_date_param(until, "until") or date_context.today_str
+    dates = date_range(end, days)
+    counts = await get_daily_counts(current_user.id, dates[0], end)
+    return DailyCountRange(
+        start=dates[0],
+        end=end,
+        days=[DailyCount(date=day, completions=counts.get(day, 0)) for day in dates],
+        total=sum(counts.values())
+    )
+
+# Sync endpoint
+@api_router.get("/sync", response_model=SyncResponse)
+async def sync_changes(
+    since: int = Query(0, ge=0, description="version returned by the previous sync; 0 for a full sync"),
+    current_user: User = Depends(get_current_user)
+):
+    # Read first: changes landing during the sync, or still in flight, are picked up by the next one
+    until = await committed_sync_version(current_user.id)
+    # A client ahead of the server holds state it cannot reconcile; start it over
+    if since > until:
+        since = 0
+    changes = await changes_since(current_user.id, since, until)
+    return SyncResponse.model_construct(
+        version=until,
+        full=since == 0,
+        habits=[Habit.model_construct(**habit_doc) for habit_doc in changes["habits"]],
+        completions=[SyncCompletion.model_construct(**completion) for completion in changes["completions"]],
+        tombstones=[SyncTombstone.model_construct(**tombstone) for tombstone in changes["tombstones"]]
+    )
+
+# Change notifications for a user's other open sessions
+@api_router.post("/events/ticket", response_model=EventsTicket)
+async def create_event_stream_ticket(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Request a fresh ticket for every connect; it is only good for opening streams
+    current_user = await get_user_from_token(credentials.credentials)
+    return EventsTicket(
+        ticket=create_events_ticket(current_user, credentials.credentials),
+        expires_in=EVENTS_TICKET_EXPIRE_SECONDS
+    )
+
+@api_router.get("/events")
+async def stream_events(
+    ticket: str = Query(..., description="from POST /api/events/ticket; EventSource cannot send an Authorization header"),
+    client_id: Optional[str] = Query(None, description="the session's X-Client-Id, whose own writes are not echoed back")
+):
+    current_user, session_expires_at = await get_user_from_events_ticket(ticket)
+    return StreamingResponse(
+        # Ends when the access token the ticket was issued for expires
+        event_hub.stream(current_user.id, client_id, session_expires_at),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-store",
+            # Stop nginx from buffering the stream
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+# Export endpoint
+@api_router.get("/export")
+async def export_history(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    if format not in EXPORTERS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORTERS)}")
+    
+    filename = f"habitflow-export-{date_context.today_str}.{format}"
+    return StreamingResponse(
+        EXPORTERS[format](current_user.id),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store"
+        }
+    )
+
+# Import endpoints
+# Running imports, referenced so they are not garbage collected mid-run
+import_tasks = set()
+
+async def resolve_import_habits(
+    user_id: str, records, habits_by_id: Dict, habits_by_name: Dict, job: ImportJob, version: int
+):
+    """Map each record to one of the user's habits, creating habits that are referenced by name only."""
+    resolved = []
+    for record in records:
+        habit_doc = habits_by_id.get(record.habit_id)
+        if habit_doc is None and record.habit_name:
+            habit_doc = habits_by_name.get(record.habit_name)
+            if habit_doc is None:
+                habit_doc = Habit(user_id=user_id, name=record.habit_name, version=version).dict()
+                await db.habits.insert_one(habit_doc)
+                habit_doc.pop("_id", None)
+                habits_by_id[habit_doc["id"]] = habit_doc
+                habits_by_name[habit_doc["name"]] = habit_doc
+                job.habits_created += 1
+        if habit_doc is None:
+            job.invalid += 1
+            if len(job.errors) < IMPORT_MAX_ERRORS:
+                job.errors.append(ImportRowError(line=record.line, message=f"Unknown habit_id {record.habit_id}"))
+            continue
+        resolved.append((habit_doc["id"], record.completion_date))
+    return resolved
+
+async def import_completions(user_id: str, pairs: set, job: ImportJob, version: int) -> set:
+    """Insert completions that do not exist yet. Returns the ids of habits that gained any."""
+    existing = set()
+    async for completion in db.habit_completions.find(
+        {
+            "user_id": user_id,
+            "habit_id": {"$in": list({habit_id for habit_id, _ in pairs})},
+            "completion_date": {"$in": list({completion_date for _, completion_date in pairs})}
+        },
+        COMPLETION_PROJECTION
+    ).batch_size(COMPLETION_CURSOR_BATCH_SIZE):
+        existing.add((completion["habit_id"], completion["completion_date"]))
+    
+    new_pairs = sorted(pairs - existing)
+    job.duplicates += len(pairs) - len(new_pairs)
+    if not new_pairs:
+        return set()
+    
+    documents = [
+        HabitCompletion.model_construct(
+            habit_id=habit_id, user_id=user_id, completion_date=completion_date, version=version
+        ).model_dump()
+        for habit_id, completion_date in new_pairs
+    ]
+    rejected = set()
+    try:
+        await db.habit_completions.insert_many(documents, ordered=False)
+    except BulkWriteError as error:
+        # Check-ins made while the import runs hit the unique index
+        if any(write_error["code"] != 11000 for write_error in error.details["writeErrors"]):
+            raise
+        rejected = {write_error["index"] for write_error in error.details["writeErrors"]}
+        job.duplicates += len(rejected)
+    
+    inserted = [pair for index, pair in enumerate(new_pairs) if index not in rejected]
+    job.inserted += len(inserted)
+    await apply_rollup_delta(user_id, count_by_date(completion_date for _, completion_date in inserted))
+    return {habit_id for habit_id, _ in inserted}
+
+async def save_import_progress(job: ImportJob):
+    job.updated_at = datetime.utcnow()
+    await db.import_jobs.update_one({"id": job.id}, {"$set": job.dict(exclude={"id", "user_id", "created_at"})})
+
+async def run_import(job: ImportJob, path: str, latest_date: str):
+    """Import an uploaded history chunk by chunk, then recompute stats once per touched habit."""
+    try:
+        habits_by_id = {}
+        habits_by_name = {}
+        async for habit_doc in db.habits.find(
+            {"user_id": job.user_id, **NOT_DELETED}, {"_id": 0, "id": 1, "user_id": 1, "name": 1}
+        ):
+            habits_by_id[habit_doc["id"]] = habit_doc
+            habits_by_name.setdefault(habit_doc["name"], habit_doc)
+        
+        touched = set()
+        chunks = iter_chunks(path, job.format)
+        # Parsing and date validation run on a worker thread, one chunk at a time
+        while (chunk := await run_in_threadpool(next, chunks, None)) is not None:
+            job.rows_read += len(chunk.records) + len(chunk.errors)
+            job.invalid += len(chunk.errors)
+            for row_error in chunk.errors[:max(0, IMPORT_MAX_ERRORS - len(job.errors))]:
+                job.errors.append(ImportRowError(**row_error))
+            records = []
+            for record in chunk.records:
+                if record.completion_date <= latest_date:
+                    records.append(record)
+                    continue
+                job.invalid += 1
+                if len(job.errors) < IMPORT_MAX_ERRORS:
+                    job.errors.append(ImportRowError(line=record.line, message="completion_date is in the future"))
+            
+            # Each chunk is one change for sync
+            async with sync_write(job.user_id) as version:
+                resolved = await resolve_import_habits(
+                    job.user_id, records, habits_by_id, habits_by_name, job, version
+                )
+                # Repeats within the chunk count as duplicates; repeats across chunks are caught by the lookup
+                pairs = set(resolved)
+                job.duplicates += len(resolved) - len(pairs)
+                if pairs:
+                    touched |= await import_completions(job.user_id, pairs, job, version)
+            await save_import_progress(job)
+        
+        if touched:
+            async with sync_write(job.user_id) as version:
+                await store_habit_stats([habits_by_id[habit_id] for habit_id in touched], version)
+            await event_hub.publish(
+                job.user_id, {"type": "completions.changed", "habit_ids": sorted(touched), "version": version}
+            )
+        job.status = "completed"
+    except Exception as error:
+        logger.exception("Import %s failed", job.id)
+        job.status = "failed"
+        job.detail = str(error) if isinstance(error, (UnicodeDecodeError, ValueError)) else "Import failed"
+    finally:
+        os.unlink(path)
+        await response_cache.invalidate(job.user_id)
+        job.finished_at = datetime.utcnow()
+        await save_import_progress(job)
+
+@api_router.post("/import", response_model=ImportJob, status_code=status.HTTP_202_ACCEPTED)
+async def import_history(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None, description="csv or ndjson; defaults to the file extension"),
+    current_user: User = Depends(get_current_user),
+    date_context: DateContext = Depends(get_date_context)
+):
+    import_format = detect_format(file.filename, format)
+    if import_format is None:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    if file.size is not None and file.size > IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Import files are limited to {IMPORT_MAX_BYTES} bytes")
+    
+    # The upload is closed as soon as this handler returns, so the import reads its own copy
+    path = await run_in_threadpool(spool_upload, file.file)
+    job = ImportJob(user_id=current_user.id, filename=file.filename, format=import_format)
+    await db.import_jobs.insert_one(job.dict())
+    
+    task = asyncio.create_task(run_import(job, path, date_context.latest_date_str))
+    import_tasks.add(task)
+    task.add_done_callback(import_tasks.discard)
+    return job
+
+@api_router.get("/import/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await db.import_jobs.find_one({"id": job_id, "user_id": current_user.id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return ImportJob(**job)
+
+# Prometheus scrape endpoint, outside /api so it is not exposed through the API ingress
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -322,8 +1140,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Outermost, so latency includes the other middleware
+app.add_middleware(InstrumentationMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -331,6 +1153,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    # Refuse to start without the indexes: the unique completion index is what
+    # stops concurrent check-ins from recording the same day twice
+    try:
+        await ensure_indexes()
+    except PyMongoError:
+        logger.exception(
+            "Failed to create database indexes; if duplicate completions block the unique index, "
+            "remove them with `python recompute_stats.py --dedupe`"
+        )
+        raise
+
+@app.on_event("startup")
+async def start_event_hub():
+    await event_hub.start()
+
+@app.on_event("startup")
+async def start_purge_worker():
+    purge_worker.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await event_hub.stop()
+    await purge_worker.stop()
     client.close()
\ No newline at end of file
@@ -0,0 +1,141 @@
+from datetime import date, datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from instrumentation import count_streak_calls
+from utils import calculate_streaks
+
+# Vectorized streak computation for many habits at once. Completion dates are
+# turned into int32 day ordinals (days since 1970-01-01) and runs of
+# consecutive days are found with diff/cumsum instead of walking Python date
+# objects. Results match utils.calculate_streaks and utils.CompletionStatsAccumulator.
+
+def dates_to_ordinals(completion_dates: Sequence[str]) -> np.ndarray:
+    """Parse YYYY-MM-DD strings into int32 day ordinals."""
+    return np.asarray(completion_dates, dtype="datetime64[D]").astype(np.int32)
+
+def ordinal_to_date_str(ordinal: int) -> str:
+    return str(np.datetime64(int(ordinal), "D"))
+
+def _date_ordinal(value: date) -> int:
+    return int(np.datetime64(value, "D").astype(np.int32))
+
+def _runs(codes: np.ndarray, days: np.ndarray):
+    """Find runs of consecutive days within each group.
+
+    codes are dense group numbers. Returns the inputs sorted by group and
+    descending day, together with the start offset of each group, the run
+    number of every element and the length of every run.
+    """
+    # Most recent day first within each group, as calculate_streaks sorts
+    order = np.lexsort((-days.astype(np.int64), codes))
+    codes = codes[order]
+    days = days[order]
+
+    continues = np.zeros(len(days), dtype=bool)
+    continues[1:] = (codes[1:] == codes[:-1]) & (days[:-1] - days[1:] == 1)
+    run_ids = np.cumsum(~continues) - 1
+    run_lengths = np.bincount(run_ids)
+
+    group_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return codes, days, group_starts, run_ids, run_lengths
+
+def _longest_runs(codes, run_ids, run_lengths, group_count):
+    run_starts = np.flatnonzero(np.r_[True, run_ids[1:] != run_ids[:-1]])
+    longest = np.zeros(group_count, dtype=np.int64)
+    np.maximum.at(longest, codes[run_starts], run_lengths)
+    return longest
+
+def streaks_from_ordinals(
+    codes: np.ndarray,
+    days: np.ndarray,
+    group_count: int,
+    today: Optional[date] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Current and longest streak for every group, indexed by group number.
+
+    Groups with duplicate days fall back to calculate_streaks, whose current
+    streak treats duplicates specially.
+    """
+    current = np.zeros(group_count, dtype=np.int64)
+    longest = np.zeros(group_count, dtype=np.int64)
+    if len(days) == 0:
+        return current, longest
+
+    today_ordinal = _date_ordinal(today or datetime.now().date())
+    codes, days, group_starts, run_ids, run_lengths = _runs(codes, days)
+    present = codes[group_starts]
+
+    longest = _longest_runs(codes, run_ids, run_lengths, group_count)
+
+    # The streak is current only if the most recent completion is today or yesterday
+    head_days = days[group_starts]
+    is_current = (head_days == today_ordinal) | (head_days == today_ordinal - 1)
+    current[present] = np.where(is_current, run_lengths[run_ids[group_starts]], 0)
+
+    duplicate_positions = np.flatnonzero((codes[1:] == codes[:-1]) & (days[1:] == days[:-1]))
+    if len(duplicate_positions):
+        group_ends = np.r_[group_starts[1:], len(days)]
+        for group in np.unique(codes[duplicate_positions]):
+            position = np.searchsorted(present, group)
+            group_days = days[group_starts[position]:group_ends[position]]
+            current[group], longest[group] = calculate_streaks(
+                [ordinal_to_date_str(day) for day in group_days], today
+            )
+
+    longest = np.maximum(longest, current)
+    return current, longest
+
+def _encode_groups(habit_ids: Sequence[str]):
+    keys, codes = np.unique(np.asarray(habit_ids, dtype=object), return_inverse=True)
+    return list(keys), codes.astype(np.int64)
+
+@count_streak_calls
+def batch_streaks(
+    habit_ids: Sequence[str],
+    completion_dates: Sequence[str],
+    today: Optional[date] = None
+) -> Dict[str, Tuple[int, int]]:
+    """calculate_streaks for many habits in one call.
+
+    habit_ids and completion_dates are parallel sequences, one entry per
+    completion. Returns (current_streak, longest_streak) keyed by habit id.
+    """
+    if len(completion_dates) == 0:
+        return {}
+    keys, codes = _encode_groups(habit_ids)
+    current, longest = streaks_from_ordinals(
+        codes, dates_to_ordinals(completion_dates), len(keys), today
+    )
+    return {key: (int(current[i]), int(longest[i])) for i, key in enumerate(keys)}
+
+@count_streak_calls
+def batch_summaries(habit_ids: Sequence[str], completion_dates: Sequence[str]) -> Dict[str, Dict]:
+    """The statistics of utils.CompletionStatsAccumulator for many habits in one call, keyed by habit id.
+
+    Habits without completions are not included in the result.
+    """
+    if len(completion_dates) == 0:
+        return {}
+    keys, codes = _encode_groups(habit_ids)
+    counts = np.bincount(codes, minlength=len(keys))
+
+    # Duplicate days count towards completion_count but not towards streaks
+    pairs = np.unique(
+        np.stack([codes, dates_to_ordinals(completion_dates).astype(np.int64)], axis=1), axis=0
+    )
+    codes, days, group_starts, run_ids, run_lengths = _runs(pairs[:, 0], pairs[:, 1])
+    longest = _longest_runs(codes, run_ids, run_lengths, len(keys))
+    head_runs = run_lengths[run_ids[group_starts]]
+
+    summaries = {}
+    for position, start in enumerate(group_starts):
+        group = codes[start]
+        summaries[keys[group]] = {
+            "current_streak": int(head_runs[position]),
+            "longest_streak": int(longest[group]),
+            "last_completion_date": ordinal_to_date_str(days[start]),
+            "completion_count": int(counts[group])
+        }
+    return summaries
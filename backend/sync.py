@@ -0,0 +1,142 @@
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
+
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+
+from database import db
+from purge import NOT_DELETED, exclude_deleted_habits
+
+# Per-user change versions for delta sync.
+#
+# Every write to a user's habits or completions takes the next value of the
+# user's sync_version counter and stamps it on the documents it writes (habit
+# statistics changes included). Deletions leave a tombstone carrying the
+# version instead. A client that has seen version N asks for everything with
+# a higher version: changed habits, changed completions and tombstones.
+#
+# A version is reserved before its write lands, so the counter alone would
+# let a sync report a version whose documents are not there yet, and the
+# client would skip them for good. Reservations are therefore listed in the
+# user's sync_pending until the write finishes, and a sync only reports up to
+# the version just below the oldest one still pending. Reservations left by
+# a crashed write stop holding syncs back after SYNC_PENDING_TIMEOUT_SECONDS.
+#
+# Deleted accounts cannot reserve versions, so every write is refused for them
+# in all workers, even where the user is still cached. The purge waits until
+# a user has no reservations in flight.
+
+SYNC_PENDING_TIMEOUT_SECONDS = int(os.getenv("SYNC_PENDING_TIMEOUT_SECONDS", "120"))
+
+async def reserve_sync_version(user_id: str) -> int:
+    """Take the next change version for a user and mark it pending, in one atomic update.
+
+    Raises 401 for a deleted account.
+    """
+    user_doc = await db.users.find_one_and_update(
+        {"id": user_id, **NOT_DELETED},
+        [
+            {"$set": {"sync_version": {"$add": [{"$ifNull": ["$sync_version", 0]}, 1]}}},
+            # A one-element $map, so the new entry's fields are evaluated against the updated counter
+            {"$set": {"sync_pending": {"$concatArrays": [
+                {"$ifNull": ["$sync_pending", []]},
+                {"$map": {"input": [0], "in": {"version": "$sync_version", "reserved_at": datetime.utcnow()}}}
+            ]}}}
+        ],
+        return_document=ReturnDocument.AFTER
+    )
+    if user_doc is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    return user_doc["sync_version"]
+
+async def release_sync_version(user_id: str, version: int):
+    await db.users.update_one({"id": user_id}, {"$pull": {"sync_pending": {"version": version}}})
+
+@asynccontextmanager
+async def sync_write(user_id: str) -> AsyncIterator[int]:
+    """Reserve a change version for the writes made inside the block."""
+    version = await reserve_sync_version(user_id)
+    try:
+        yield version
+    finally:
+        await release_sync_version(user_id, version)
+
+def live_pending_versions(user_doc: Dict) -> List[int]:
+    """Versions reserved by writes still in flight, leaving out abandoned reservations."""
+    cutoff = datetime.utcnow() - timedelta(seconds=SYNC_PENDING_TIMEOUT_SECONDS)
+    return [entry["version"] for entry in user_doc.get("sync_pending", []) if entry["reserved_at"] > cutoff]
+
+async def has_writes_in_flight(user_id: str) -> bool:
+    user_doc = await db.users.find_one({"id": user_id}, {"sync_pending": 1, "_id": 0})
+    return user_doc is not None and bool(live_pending_versions(user_doc))
+
+async def committed_sync_version(user_id: str) -> int:
+    """The highest version below which every write has landed."""
+    user_doc = await db.users.find_one({"id": user_id}, {"sync_version": 1, "sync_pending": 1, "_id": 0})
+    if user_doc is None:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(seconds=SYNC_PENDING_TIMEOUT_SECONDS)
+    pending = live_pending_versions(user_doc)
+    if len(pending) < len(user_doc.get("sync_pending", [])):
+        await db.users.update_one({"id": user_id}, {"$pull": {"sync_pending": {"reserved_at": {"$lte": cutoff}}}})
+    if pending:
+        return min(pending) - 1
+    return user_doc.get("sync_version", 0)
+
+async def add_tombstones(
+    user_id: str,
+    version: int,
+    habit_ids: Iterable[str] = (),
+    completions: Iterable[Tuple[str, str]] = (),
+    session=None
+):
+    """Record deleted habits and deleted (habit_id, completion_date) completions.
+
+    A habit tombstone also stands for all of that habit's completions.
+    """
+    deleted_at = datetime.utcnow()
+    documents = [
+        {"user_id": user_id, "kind": "habit", "habit_id": habit_id, "completion_date": None,
+         "version": version, "deleted_at": deleted_at}
+        for habit_id in habit_ids
+    ] + [
+        {"user_id": user_id, "kind": "completion", "habit_id": habit_id, "completion_date": completion_date,
+         "version": version, "deleted_at": deleted_at}
+        for habit_id, completion_date in completions
+    ]
+    if documents:
+        await db.tombstones.insert_many(documents, ordered=False, session=session)
+
+async def changes_since(user_id: str, since: int, until: int) -> Dict[str, List[Dict]]:
+    """Habits, completions and tombstones with since < version <= until.
+
+    since=0 is a full sync: every live document, including ones written before
+    versions existed, and no tombstones.
+    """
+    if since > 0:
+        version_range = {"version": {"$gt": since, "$lte": until}}
+        tombstone_cursor = db.tombstones.find(
+            {"user_id": user_id, **version_range},
+            {"_id": 0, "kind": 1, "habit_id": 1, "completion_date": 1, "version": 1}
+        )
+        tombstones = [tombstone async for tombstone in tombstone_cursor]
+    else:
+        # Documents written after the counter was read are left for the next sync
+        version_range = {"version": {"$not": {"$gt": until}}}
+        tombstones = []
+
+    habits = [
+        habit_doc async for habit_doc in db.habits.find(
+            {"user_id": user_id, **version_range, **NOT_DELETED}, {"_id": 0}
+        )
+    ]
+    completion_query = await exclude_deleted_habits({"user_id": user_id, **version_range})
+    completions = [
+        completion async for completion in db.habit_completions.find(
+            completion_query,
+            {"_id": 0, "id": 1, "habit_id": 1, "completion_date": 1, "created_at": 1, "version": 1}
+        ).batch_size(1000)
+    ]
+    return {"habits": habits, "completions": completions, "tombstones": tombstones}
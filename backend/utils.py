@@ -1,8 +1,42 @@
-from datetime import datetime, timedelta
-from typing import List, Dict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional
 from collections import defaultdict
+from zoneinfo import ZoneInfo
 
-def calculate_streaks(completion_dates: List[str]) -> tuple[int, int]:
+from instrumentation import count_streak_calls
+
+@dataclass(frozen=True)
+class DateContext:
+    """The calendar days a request works with, resolved once in the user's timezone."""
+    today: date
+    today_str: str
+    yesterday_str: str
+    week_start_str: str  # first of the 7 days ending today
+    latest_date_str: str  # latest day a check-in may be recorded for
+    
+    @classmethod
+    def for_date(cls, today: date, margin_days: int = 0) -> "DateContext":
+        return cls(
+            today=today,
+            today_str=today.strftime("%Y-%m-%d"),
+            yesterday_str=(today - timedelta(days=1)).strftime("%Y-%m-%d"),
+            week_start_str=(today - timedelta(days=6)).strftime("%Y-%m-%d"),
+            latest_date_str=(today + timedelta(days=margin_days)).strftime("%Y-%m-%d")
+        )
+    
+    @classmethod
+    def for_timezone(cls, timezone: Optional[str] = None) -> "DateContext":
+        """The current day in an IANA timezone; None means the server's local time.
+        
+        Without a timezone the client's day may already be tomorrow on the server,
+        so check-ins are accepted up to one day ahead.
+        """
+        now = datetime.now(ZoneInfo(timezone)) if timezone else datetime.now()
+        return cls.for_date(now.date(), 0 if timezone else 1)
+
+@count_streak_calls
+def calculate_streaks(completion_dates: List[str], today: Optional[date] = None) -> tuple[int, int]:
     """Calculate current and longest streaks from completion dates."""
     if not completion_dates:
         return 0, 0
@@ -14,7 +48,7 @@ def calculate_streaks(completion_dates: List[str]) -> tuple[int, int]:
     date_objects = [datetime.strptime(date, "%Y-%m-%d").date() for date in sorted_dates]
     
     # Calculate current streak
-    today = datetime.now().date()
+    today = today or datetime.now().date()
     current_streak = 0
     
     # Check if the most recent completion was today or yesterday
@@ -52,25 +86,120 @@ def calculate_streaks(completion_dates: List[str]) -> tuple[int, int]:
     
     return current_streak, longest_streak
 
-def get_week_performance(habits_data: List[Dict]) -> List[Dict]:
-    """Get this week's performance data."""
-    today = datetime.now().date()
+class CompletionStatsAccumulator:
+    """Builds the streak statistics stored on a habit document from dates fed one at a time.
+    
+    current_streak is the run of consecutive days ending at last_completion_date;
+    use current_streak_as_of() to turn it into the streak as seen today.
+    
+    Dates must arrive in ascending order, as read from the completions index;
+    memory use does not grow with the length of the history.
+    """
+    
+    def __init__(self):
+        self.completion_count = 0
+        self.current_streak = 0
+        self.longest_streak = 0
+        self.last_completion_date = None
+        self._last_day = None
+    
+    def add(self, completion_date: str):
+        self.completion_count += 1
+        if completion_date == self.last_completion_date:
+            return
+        if self.last_completion_date is not None and completion_date < self.last_completion_date:
+            raise ValueError("completion dates must be added in ascending order")
+        
+        day = date.fromisoformat(completion_date)
+        if self._last_day is not None and day - self._last_day == timedelta(days=1):
+            self.current_streak += 1
+        else:
+            self.current_streak = 1
+        self.longest_streak = max(self.longest_streak, self.current_streak)
+        self.last_completion_date = completion_date
+        self._last_day = day
+    
+    def stats(self) -> Dict:
+        return {
+            "current_streak": self.current_streak,
+            "longest_streak": self.longest_streak,
+            "last_completion_date": self.last_completion_date,
+            "completion_count": self.completion_count
+        }
+
+@count_streak_calls
+def accumulate_completions(accumulators: Dict[str, CompletionStatsAccumulator], completions: List[Dict]):
+    """Feed a batch of completions, sorted by habit and date, to their habits' accumulators."""
+    for completion in completions:
+        accumulators[completion["habit_id"]].add(completion["completion_date"])
+
+def apply_completion_to_stats(stats: Dict, completion_date: str) -> Optional[Dict]:
+    """Update stored streak statistics for a newly added completion.
+    
+    Returns None when the date is not after last_completion_date, in which case
+    the statistics have to be recomputed from the full history.
+    """
+    last_completion_date = stats.get("last_completion_date")
+    if last_completion_date is None:
+        run = 1
+    elif completion_date <= last_completion_date:
+        return None
+    else:
+        gap = (datetime.strptime(completion_date, "%Y-%m-%d")
+               - datetime.strptime(last_completion_date, "%Y-%m-%d")).days
+        run = stats["current_streak"] + 1 if gap == 1 else 1
+    
+    return {
+        "current_streak": run,
+        "longest_streak": max(stats.get("longest_streak", 0), run),
+        "last_completion_date": completion_date,
+        "completion_count": stats.get("completion_count", 0) + 1
+    }
+
+def apply_uncompletion_to_stats(stats: Dict, completion_date: str) -> Optional[Dict]:
+    """Update stored streak statistics for a removed completion.
+    
+    Only removing the latest day of a streak that is not the longest one can be
+    applied incrementally; otherwise returns None and the statistics have to be
+    recomputed from the full history.
+    """
+    run = stats.get("current_streak", 0)
+    if (completion_date != stats.get("last_completion_date")
+            or run <= 1 or run >= stats.get("longest_streak", 0)):
+        return None
+    
+    previous_date = datetime.strptime(completion_date, "%Y-%m-%d") - timedelta(days=1)
+    return {
+        "current_streak": run - 1,
+        "longest_streak": stats["longest_streak"],
+        "last_completion_date": previous_date.strftime("%Y-%m-%d"),
+        "completion_count": stats["completion_count"] - 1
+    }
+
+def current_streak_as_of(stats: Dict, dates: Optional[DateContext] = None) -> int:
+    """Current streak from stored statistics; a streak survives until the end of the day after its last completion."""
+    last_completion_date = stats.get("last_completion_date")
+    if not last_completion_date:
+        return 0
+    
+    dates = dates or DateContext.for_timezone()
+    if last_completion_date in (dates.today_str, dates.yesterday_str):
+        return stats.get("current_streak", 0)
+    return 0
+
+def get_week_performance(completions_by_date: Dict[str, int], today: Optional[date] = None) -> List[Dict]:
+    """Get this week's performance data from completion counts keyed by date."""
+    today = today or datetime.now().date()
     week_data = []
     
     for i in range(6, -1, -1):  # Last 7 days
         date = today - timedelta(days=i)
         date_str = date.strftime("%Y-%m-%d")
         
-        # Count completions for this date across all habits
-        completions = 0
-        for habit in habits_data:
-            if date_str in habit.get('completed_dates', []):
-                completions += 1
-        
         week_data.append({
             'date': date_str,
             'day': date.strftime('%a'),
-            'completions': completions
+            'completions': completions_by_date.get(date_str, 0)
         })
     
     return week_data
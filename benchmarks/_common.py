@@ -0,0 +1,134 @@
+"""
+Shared helpers for the backend benchmark scripts.
+
+The benchmarks run the FastAPI app in-process. By default they talk to the
+MongoDB instance configured in backend/.env (using a throwaway database);
+pass --mongomock to run against an in-memory mongomock database instead.
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+BENCH_DB_NAME = "habitflow_benchmark"
+
+# Commands issued by the driver itself rather than by application code
+DRIVER_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "endSessions", "buildInfo"}
+
+
+class RoundTripCounter:
+    """Counts database commands issued by application code."""
+
+    def __init__(self):
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+
+class _CommandCounter:
+    """pymongo CommandListener that feeds a RoundTripCounter."""
+
+    def __init__(self, counter):
+        self.counter = counter
+
+    def started(self, event):
+        if event.command_name not in DRIVER_COMMANDS:
+            self.counter.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# mongomock does not emit command events, so count the collection methods that
+# would each be one server round trip. find_one() calls find() internally, so
+# only the outermost call is counted.
+MOCK_COUNTED_METHODS = (
+    "find", "find_one", "aggregate", "insert_one", "insert_many",
+    "update_one", "update_many", "delete_one", "delete_many", "bulk_write",
+    "count_documents", "find_one_and_update", "find_one_and_delete",
+)
+
+
+def _instrument_mongomock(counter):
+    import mongomock
+
+    state = threading.local()
+
+    def wrap(method):
+        def counted(*args, **kwargs):
+            depth = getattr(state, "depth", 0)
+            if depth == 0:
+                counter.count += 1
+            state.depth = depth + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                state.depth = depth
+        return counted
+
+    for name in MOCK_COUNTED_METHODS:
+        setattr(mongomock.Collection, name, wrap(getattr(mongomock.Collection, name)))
+
+
+def setup_database(use_mongomock=False):
+    """
+    Point the backend's database module at the benchmark database.
+
+    Must run before server/auth are imported, since they bind `db` at import time.
+    Returns the RoundTripCounter wired into the client.
+    """
+    import database
+
+    counter = RoundTripCounter()
+    if use_mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+
+        _instrument_mongomock(counter)
+        database.client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        database.client = AsyncIOMotorClient(
+            database.settings.url,
+            event_listeners=[_CommandCounter(counter)],
+            **database.settings.client_options()
+        )
+    database.db = database.client[BENCH_DB_NAME]
+    database.stats_db = database.db
+    return counter
+
+
+async def reset_database():
+    import database
+
+    await database.client.drop_database(BENCH_DB_NAME)
+
+
+async def create_user(http, email="bench@example.com", password="BenchPass123!"):
+    """Register and log in a user, returning (user_id, auth headers)."""
+    response = await http.post("/api/auth/register", json={
+        "name": "Bench User", "email": email, "password": password
+    })
+    response.raise_for_status()
+    user_id = response.json()["id"]
+
+    response = await http.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    return user_id, {"Authorization": f"Bearer {token}"}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark for GET /api/habits.
+
+Compares the legacy per-habit completion query loop (N+1 round trips) with the
+current batched implementation, reporting database round trips per request and
+p50/p99 latency at several habit counts.
+
+Usage:
+    python benchmarks/bench_get_habits.py [--mongomock] [--sizes 10 100 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from _common import create_user, percentile, reset_database, setup_database
+
+
+def build_legacy_route():
+    """The pre-batching GET /api/habits handler: one completions query per habit."""
+    from fastapi import Depends
+
+    from auth import get_current_user
+    from database import db
+    from models import Habit, HabitWithStats, User
+    from utils import calculate_streaks
+
+    async def legacy_get_habits(current_user: User = Depends(get_current_user)):
+        habits = await db.habits.find({"user_id": current_user.id}).to_list(100)
+        habits_with_stats = []
+        for habit_doc in habits:
+            habit = Habit(**habit_doc)
+            completions = await db.habit_completions.find({
+                "habit_id": habit.id,
+                "user_id": current_user.id
+            }).to_list(1000)
+            completed_dates = [comp["completion_date"] for comp in completions]
+            current_streak, longest_streak = calculate_streaks(completed_dates)
+            habits_with_stats.append(HabitWithStats(**{
+                **habit.dict(),
+                "current_streak": current_streak,
+                "longest_streak": longest_streak,
+                "completion_count": len(completed_dates),
+                "completed_dates": completed_dates
+            }))
+        return habits_with_stats
+
+    return legacy_get_habits
+
+
+async def seed_habits(user_id, habit_count, history_days):
+    from database import db
+
+    today = date.today()
+    habits = []
+    completions = []
+    for i in range(habit_count):
+        habit_id = str(uuid.uuid4())
+        habits.append({
+            "id": habit_id,
+            "user_id": user_id,
+            "name": f"Habit {i}",
+            "description": "",
+            "color": "#3B82F6",
+            "icon": "brain",
+            "target_days": 30,
+            "created_at": datetime.utcnow(),
+        })
+        for day in range(history_days):
+            completions.append({
+                "id": str(uuid.uuid4()),
+                "habit_id": habit_id,
+                "user_id": user_id,
+                "completion_date": (today - timedelta(days=day)).strftime("%Y-%m-%d"),
+                "created_at": datetime.utcnow(),
+            })
+    await db.habits.insert_many(habits)
+    if completions:
+        await db.habit_completions.insert_many(completions)
+
+
+async def measure(http, counter, path, headers, iterations):
+    latencies = []
+    round_trips = []
+    for _ in range(iterations):
+        counter.reset()
+        started = time.perf_counter()
+        response = await http.get(path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        round_trips.append(counter.count)
+        response.raise_for_status()
+    return {
+        "round_trips": max(round_trips),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+async def main(args):
+    # Measure the query path itself rather than cached responses
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "none")
+    counter = setup_database(use_mongomock=args.mongomock)
+
+    import httpx
+    from server import app
+
+    app.add_api_route("/api/_bench/legacy-habits", build_legacy_route(), methods=["GET"])
+    transport = httpx.ASGITransport(app=app)
+
+    print(f"{'habits':>7} {'variant':>8} {'round trips':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    for size in args.sizes:
+        await reset_database()
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            user_id, headers = await create_user(http)
+            await seed_habits(user_id, size, args.history_days)
+            for variant, path in (("before", "/api/_bench/legacy-habits"), ("after", "/api/habits")):
+                result = await measure(http, counter, path, headers, args.iterations)
+                print(f"{size:>7} {variant:>8} {result['round_trips']:>12} "
+                      f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+    await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory mongomock database")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="habit counts to test")
+    parser.add_argument("--history-days", type=int, default=30, help="completions seeded per habit")
+    parser.add_argument("--iterations", type=int, default=50, help="requests per variant and size")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for serializing the GET /api/habits payload.
+
+Compares the previous path (Habit(**doc) -> .dict() -> HabitWithStats(**...),
+then jsonable_encoder and the stdlib-based JSONResponse) with the current one
+(HabitWithStats.model_construct on the trusted document, then orjson), and
+checks both produce the same JSON.
+
+Usage:
+    python benchmarks/bench_serialization.py [--habits 100] [--history-days 90]
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import _common  # noqa: F401  (puts backend/ on sys.path)
+from _common import percentile
+
+
+def build_documents(habit_count, history_days):
+    """Habit documents as stored, plus each habit's completed_dates window."""
+    today = date.today()
+    completed_dates = [(today - timedelta(days=day)).strftime("%Y-%m-%d") for day in range(history_days)]
+    documents = []
+    for i in range(habit_count):
+        documents.append({
+            "id": str(uuid.uuid4()),
+            "user_id": "bench-user",
+            "name": f"Habit {i}",
+            "description": "Benchmark habit",
+            "color": "#3B82F6",
+            "icon": "brain",
+            "target_days": 30,
+            "created_at": datetime.utcnow(),
+            "current_streak": history_days,
+            "longest_streak": history_days,
+            "last_completion_date": completed_dates[0] if completed_dates else None,
+            "completion_count": history_days,
+        })
+    return documents, completed_dates
+
+
+def serialize_before(documents, completed_dates):
+    from models import Habit, HabitWithStats
+    from utils import current_streak_as_of
+
+    habits = []
+    for habit_doc in documents:
+        habit = Habit(**habit_doc)
+        habits.append(HabitWithStats(**{
+            **habit.dict(),
+            "current_streak": current_streak_as_of(habit_doc),
+            "completed_dates": completed_dates
+        }))
+    return JSONResponse(jsonable_encoder(habits)).body
+
+
+def serialize_after(documents, completed_dates):
+    from server import build_habit_with_stats, dump_json
+    from utils import DateContext
+
+    date_context = DateContext.for_timezone()
+    return dump_json([build_habit_with_stats(habit_doc, completed_dates, date_context) for habit_doc in documents])
+
+
+def measure(func, documents, completed_dates, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func(documents, completed_dates)
+        timings.append((time.perf_counter() - started) * 1000)
+    return percentile(timings, 50), percentile(timings, 99)
+
+
+def main(args):
+    documents, completed_dates = build_documents(args.habits, args.history_days)
+    if json.loads(serialize_before(documents, completed_dates)) != json.loads(serialize_after(documents, completed_dates)):
+        raise SystemExit("Serialized payloads differ")
+
+    payload_kb = len(serialize_after(documents, completed_dates)) / 1024
+    print(f"{args.habits} habits x {args.history_days} completed dates, {payload_kb:.0f} KiB payload")
+    print(f"{'variant':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    results = {}
+    for variant, func in (("before", serialize_before), ("after", serialize_after)):
+        results[variant] = measure(func, documents, completed_dates, args.iterations)
+        print(f"{variant:>8} {results[variant][0]:>9.3f} {results[variant][1]:>9.3f}")
+    print(f"speedup (p50): {results['before'][0] / results['after'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=100, help="habits in the payload")
+    parser.add_argument("--history-days", type=int, default=90, help="completed_dates per habit")
+    parser.add_argument("--iterations", type=int, default=200, help="serializations per variant")
+    main(parser.parse_args())
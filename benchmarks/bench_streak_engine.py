@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized streak engine.
+
+Compares utils.calculate_streaks, called once per habit, with
+streak_engine.batch_streaks over all habits at once, and checks both
+produce the same results.
+
+Usage:
+    python benchmarks/bench_streak_engine.py [--sizes 1000 100000 10000000]
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import _common  # noqa: F401  (puts backend/ on sys.path)
+from streak_engine import batch_streaks, dates_to_ordinals, streaks_from_ordinals
+from utils import calculate_streaks
+
+
+def generate(total_completions, per_habit, seed=0):
+    """Completion histories with random gaps, as parallel habit_id/date lists."""
+    rng = random.Random(seed)
+    today = date.today()
+    habit_ids = []
+    completion_dates = []
+    habit = 0
+    while len(completion_dates) < total_completions:
+        count = min(per_habit, total_completions - len(completion_dates))
+        day = today - timedelta(days=rng.randint(0, 2))
+        for _ in range(count):
+            habit_ids.append(f"habit-{habit}")
+            completion_dates.append(day.strftime("%Y-%m-%d"))
+            day -= timedelta(days=1 if rng.random() < 0.9 else rng.randint(2, 5))
+        habit += 1
+    return habit_ids, completion_dates
+
+
+def run_scalar(habit_ids, completion_dates):
+    grouped = {}
+    for habit_id, completion_date in zip(habit_ids, completion_dates):
+        grouped.setdefault(habit_id, []).append(completion_date)
+    return {habit_id: calculate_streaks(dates) for habit_id, dates in grouped.items()}
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main(args):
+    print(f"{'completions':>12} {'habits':>8} {'scalar s':>10} {'engine s':>10} "
+          f"{'engine (ordinals) s':>20} {'speedup':>8}")
+    for size in args.sizes:
+        habit_ids, completion_dates = generate(size, args.per_habit)
+
+        scalar, scalar_seconds = timed(run_scalar, habit_ids, completion_dates)
+        engine, engine_seconds = timed(batch_streaks, habit_ids, completion_dates)
+        if scalar != engine:
+            raise SystemExit(f"Result mismatch at {size} completions")
+
+        # Engine cost once dates are already int32 ordinals (e.g. stored that way)
+        _, codes = np.unique(np.asarray(habit_ids, dtype=object), return_inverse=True)
+        days = dates_to_ordinals(completion_dates)
+        _, ordinal_seconds = timed(streaks_from_ordinals, codes, days, int(codes.max()) + 1)
+
+        print(f"{size:>12} {len(engine):>8} {scalar_seconds:>10.3f} {engine_seconds:>10.3f} "
+              f"{ordinal_seconds:>20.3f} {scalar_seconds / engine_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 10_000_000],
+                        help="total completions to test")
+    parser.add_argument("--per-habit", type=int, default=730, help="completions per habit (default: two years)")
+    main(parser.parse_args())
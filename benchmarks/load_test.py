@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Async load generator for the Habit Tracker API.
+
+Replays the flows exercised by backend_test.py (register, login, create
+habits, complete/uncomplete, list habits, stats overview) for many
+concurrent users and reports requests per second and p50/p95/p99 latency
+per endpoint.
+
+By default the FastAPI app runs in-process against the MongoDB configured in
+backend/.env (in a throwaway database); --mongomock uses an in-memory
+database instead and --url targets a running server.
+
+Results can be saved as a JSON baseline and later runs compared against it;
+the script exits non-zero when a watched endpoint's p95 regresses.
+
+Usage:
+    python benchmarks/load_test.py --mongomock --users 20 --history-days 365
+    python benchmarks/load_test.py --save-baseline baseline.json
+    python benchmarks/load_test.py --compare baseline.json --threshold 1.25
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from _common import percentile, reset_database, setup_database
+
+# Same habits backend_test.py creates
+HABIT_TEMPLATES = [
+    {
+        "name": "Morning Meditation",
+        "description": "10 minutes of mindfulness meditation every morning",
+        "color": "#10B981",
+        "icon": "meditation",
+        "target_days": 30
+    },
+    {
+        "name": "Daily Exercise",
+        "description": "30 minutes of physical activity",
+        "color": "#EF4444",
+        "icon": "fitness",
+        "target_days": 21
+    },
+    {
+        "name": "Read Daily",
+        "description": "Read for 30 minutes every day",
+        "color": "#8B5CF6",
+        "icon": "book",
+        "target_days": 14
+    },
+]
+
+DEFAULT_WATCHED = ["GET /api/habits", "GET /api/stats/overview"]
+
+BULK_LIMIT = 1000
+
+
+class Recorder:
+    """Collects per-endpoint latencies."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished = None
+        self.setup = None
+
+    async def request(self, http, method, path, name, expected=(200,), **kwargs):
+        started = time.perf_counter()
+        response = await http.request(method, path, **kwargs)
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        if response.status_code not in expected:
+            self.errors[name] += 1
+        return response
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        for name, samples in sorted(self.latencies.items()):
+            endpoints[name] = {
+                "requests": len(samples),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50), 2),
+                "p95_ms": round(percentile(samples, 95), 2),
+                "p99_ms": round(percentile(samples, 99), 2),
+            }
+        summary = {"elapsed_s": round(elapsed, 2), "endpoints": endpoints}
+        if self.setup:
+            summary["setup"] = self.setup
+        return summary
+
+
+async def seed_history(http, headers, habit_ids, history_days):
+    """Backfill completion history through the bulk endpoint (not measured)."""
+    today = datetime.now()
+    items = [
+        {"habit_id": habit_id, "completion_date": (today - timedelta(days=day)).strftime("%Y-%m-%d")}
+        for habit_id in habit_ids
+        for day in range(1, history_days + 1)
+        if random.random() < 0.8
+    ]
+    for start in range(0, len(items), BULK_LIMIT):
+        response = await http.post("/api/completions/bulk", json={"items": items[start:start + BULK_LIMIT]},
+                                   headers=headers)
+        response.raise_for_status()
+
+
+async def user_session(http, recorder, args, barrier):
+    email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+    password = "SecurePass123!"
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    # Setup: register, login, create habits, seed history
+    await recorder.request(http, "POST", "/api/auth/register", "POST /api/auth/register",
+                           json={"name": "Load Test User", "email": email, "password": password})
+    response = await recorder.request(http, "POST", "/api/auth/login", "POST /api/auth/login",
+                                      json={"email": email, "password": password})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    habit_ids = []
+    for i in range(args.habits_per_user):
+        template = dict(HABIT_TEMPLATES[i % len(HABIT_TEMPLATES)])
+        template["name"] = f"{template['name']} {i}"
+        response = await recorder.request(http, "POST", "/api/habits", "POST /api/habits",
+                                          json=template, headers=headers)
+        habit_ids.append(response.json()["id"])
+    if args.history_days:
+        await seed_history(http, headers, habit_ids, args.history_days)
+
+    await barrier.wait()
+
+    # Dashboard loop: load, check a habit in, reload, check it back out
+    for _ in range(args.iterations):
+        await recorder.request(http, "GET", "/api/habits", "GET /api/habits", headers=headers)
+        await recorder.request(http, "GET", "/api/stats/overview", "GET /api/stats/overview", headers=headers)
+        habit_id = random.choice(habit_ids)
+        await recorder.request(http, "POST", f"/api/habits/{habit_id}/complete",
+                               "POST /api/habits/{id}/complete",
+                               json={"completion_date": today}, headers=headers)
+        await recorder.request(http, "GET", "/api/habits", "GET /api/habits", headers=headers)
+        await recorder.request(http, "DELETE", f"/api/habits/{habit_id}/complete/{today}",
+                               "DELETE /api/habits/{id}/complete/{date}", headers=headers)
+
+
+class Barrier:
+    """Releases all sessions at once when setup is done, and starts the clock."""
+
+    def __init__(self, parties, recorder):
+        self.parties = parties
+        self.recorder = recorder
+        self.waiting = 0
+        self.event = asyncio.Event()
+
+    async def wait(self):
+        self.waiting += 1
+        if self.waiting == self.parties:
+            # Setup requests are reported separately from the measured phase
+            self.recorder.setup = self.recorder.summary()
+            self.recorder.latencies.clear()
+            self.recorder.errors.clear()
+            self.recorder.started = time.perf_counter()
+            self.event.set()
+        await self.event.wait()
+
+
+async def run(args):
+    import httpx
+
+    if args.url:
+        client_kwargs = {"base_url": args.url.rstrip("/")}
+    else:
+        setup_database(use_mongomock=args.mongomock)
+        from database import ensure_indexes
+        from server import app
+
+        # ASGITransport does not run startup hooks
+        await reset_database()
+        await ensure_indexes()
+        client_kwargs = {"transport": httpx.ASGITransport(app=app), "base_url": "http://load-test"}
+
+    recorder = Recorder()
+    barrier = Barrier(args.users, recorder)
+    limits = httpx.Limits(max_connections=args.users)
+    async with httpx.AsyncClient(timeout=60, limits=limits, **client_kwargs) as http:
+        await asyncio.gather(*(user_session(http, recorder, args, barrier) for _ in range(args.users)))
+    recorder.finished = time.perf_counter()
+
+    if not args.url:
+        await reset_database()
+    return recorder.summary()
+
+
+def print_table(title, summary):
+    print(f"\n{title}: {summary['elapsed_s']}s")
+    print(f"{'endpoint':<42} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in summary["endpoints"].items():
+        print(f"{name:<42} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+
+def print_summary(summary):
+    if "setup" in summary:
+        print_table("Setup phase (register, login, create habits)", summary["setup"])
+    print_table("Measured phase", summary)
+
+
+def compare(summary, baseline, watched, threshold):
+    """Return the watched endpoints whose p95 grew by more than threshold."""
+    regressions = []
+    for name in watched:
+        current = summary["endpoints"].get(name)
+        previous = baseline["endpoints"].get(name)
+        if not current or not previous or not previous["p95_ms"]:
+            continue
+        ratio = current["p95_ms"] / previous["p95_ms"]
+        marker = "REGRESSION" if ratio > threshold else "ok"
+        print(f"{name:<42} p95 {previous['p95_ms']:>8.2f} -> {current['p95_ms']:>8.2f} ms ({ratio:.2f}x) {marker}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--mongomock", action="store_true", help="in-process app on an in-memory database")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--habits-per-user", type=int, default=5)
+    parser.add_argument("--history-days", type=int, default=90, help="days of completion history per habit")
+    parser.add_argument("--iterations", type=int, default=20, help="dashboard loops per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=1.2, help="allowed p95 ratio before failing")
+    parser.add_argument("--watch", nargs="+", default=DEFAULT_WATCHED, help="endpoints checked against the baseline")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    summary = asyncio.run(run(args))
+    summary["config"] = {
+        "users": args.users,
+        "habits_per_user": args.habits_per_user,
+        "history_days": args.history_days,
+        "iterations": args.iterations,
+        "target": args.url or ("in-process/mongomock" if args.mongomock else "in-process/mongod"),
+    }
+    print_summary(summary)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nComparing with {args.compare} (threshold {args.threshold:.2f}x)")
+        if compare(summary, baseline, args.watch, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,16 @@ import { Card, CardContent, CardHeader, CardTitle } from '../ui/card';
 import { Calendar } from '../ui/calendar';
 import { Badge } from '../ui/badge';
 import { Skeleton } from '../ui/skeleton';
-import { habitsAPI } from '../../services/api';
+import { habitsAPI, statsAPI } from '../../services/api';
 import { useToast } from '../../hooks/use-toast';
+import { toLocalDateString } from '../../lib/utils';
 import { ChevronLeft, ChevronRight, Calendar as CalendarIcon } from 'lucide-react';
 
 const CalendarView = () => {
   const [selectedDate, setSelectedDate] = useState(new Date());
   const [selectedMonth, setSelectedMonth] = useState(new Date());
   const [habits, setHabits] = useState([]);
+  const [calendarData, setCalendarData] = useState({ completion_dates: [], habits_by_date: {} });
   const [loading, setLoading] = useState(true);
   const { toast } = useToast();
 
@@ -34,26 +36,43 @@ const CalendarView = () => {
     fetchHabits();
   }, [toast]);
 
-  // Get all completion dates from all habits
-  const getAllCompletionDates = () => {
-    const allDates = new Set();
-    habits.forEach(habit => {
-      habit.completed_dates?.forEach(date => {
-        allDates.add(date);
-      });
-    });
-    return Array.from(allDates);
-  };
+  // Only load completions for the month being shown
+  useEffect(() => {
+    const fetchCalendar = async () => {
+      try {
+        const data = await statsAPI.getCalendar(
+          selectedMonth.getMonth() + 1,
+          selectedMonth.getFullYear()
+        );
+        setCalendarData(data);
+      } catch (error) {
+        console.error('Failed to fetch calendar data:', error);
+        toast({
+          title: "Error",
+          description: "Failed to load calendar",
+          variant: "destructive"
+        });
+      }
+    };
+
+    fetchCalendar();
+  }, [selectedMonth, toast]);
 
   // Get habits completed on a specific date
   const getHabitsForDate = (date) => {
-    const dateStr = date.toISOString().split('T')[0];
-    return habits.filter(habit => 
-      habit.completed_dates?.includes(dateStr)
-    );
+    const dateStr = toLocalDateString(date);
+    const habitIds = calendarData.habits_by_date[dateStr] || [];
+    return habits.filter(habit => habitIds.includes(habit.id));
+  };
+
+  // Count a habit's completions in the month being shown
+  const getMonthCompletions = (habitId) => {
+    return Object.values(calendarData.habits_by_date)
+      .filter(habitIds => habitIds.includes(habitId))
+      .length;
   };
 
-  const completionDates = getAllCompletionDates();
+  const completionDates = calendarData.completion_dates;
   const selectedDateHabits = getHabitsForDate(selectedDate);
 
   if (loading) {
@@ -205,11 +224,7 @@ const CalendarView = () => {
               const currentMonth = selectedMonth.getMonth();
               const currentYear = selectedMonth.getFullYear();
               
-              const monthCompletions = (habit.completed_dates || []).filter(date => {
-                const completionDate = new Date(date);
-                return completionDate.getMonth() === currentMonth && 
-                       completionDate.getFullYear() === currentYear;
-              }).length;
+              const monthCompletions = getMonthCompletions(habit.id);
 
               const daysInMonth = new Date(currentYear, currentMonth + 1, 0).getDate();
               const completionRate = Math.round((monthCompletions / daysInMonth) * 100);
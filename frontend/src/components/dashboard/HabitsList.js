@@ -5,8 +5,10 @@ import { Progress } from '../ui/progress';
 import { Badge } from '../ui/badge';
 import { Checkbox } from '../ui/checkbox';
 import { Skeleton } from '../ui/skeleton';
-import { habitsAPI } from '../../services/api';
+import { eventsAPI, habitsAPI } from '../../services/api';
 import { useToast } from '../../hooks/use-toast';
+import { toLocalDateString } from '../../lib/utils';
+import { applyHabitEvent, isLocalEvent, withCompletionResult } from '../../lib/habitEvents';
 import { 
   Droplets, 
   Brain, 
@@ -52,7 +54,7 @@ const iconMap = {
 
 const HabitCard = ({ habit, onToggle, onDelete, onEdit }) => {
   const IconComponent = iconMap[habit.icon] || Brain;
-  const today = new Date().toISOString().split('T')[0];
+  const today = toLocalDateString();
   const isCompletedToday = habit.completed_dates?.includes(today) || false;
   const progress = Math.round((habit.completion_count / habit.target_days) * 100);
   const { toast } = useToast();
@@ -193,20 +195,28 @@ const HabitsList = () => {
 
   useEffect(() => {
     fetchHabits();
+    // Follow changes made in other tabs and devices
+    return eventsAPI.subscribe((event) => {
+      if (isLocalEvent(event)) {
+        setHabits((current) => applyHabitEvent(current, event));
+      } else {
+        fetchHabits();
+      }
+    });
   }, []);
 
   const handleToggleHabit = async (habitId, isCurrentlyCompleted) => {
-    const today = new Date().toISOString().split('T')[0];
+    const today = toLocalDateString();
     
     try {
-      if (isCurrentlyCompleted) {
-        await habitsAPI.uncompleteHabit(habitId, today);
-      } else {
-        await habitsAPI.completeHabit(habitId, today);
-      }
+      const result = isCurrentlyCompleted
+        ? await habitsAPI.uncompleteHabit(habitId, today)
+        : await habitsAPI.completeHabit(habitId, today);
       
-      // Refresh habits to get updated data
-      await fetchHabits();
+      // Patch the toggled habit with the stats returned by the server instead of reloading the list
+      setHabits((current) => current.map((habit) => (
+        habit.id === habitId ? withCompletionResult(habit, result) : habit
+      )));
     } catch (error) {
       console.error('Failed to toggle habit:', error);
       throw error;
@@ -292,7 +302,7 @@ const HabitsList = () => {
   }
 
   const todayCompletions = habits.filter(h => {
-    const today = new Date().toISOString().split('T')[0];
+    const today = toLocalDateString();
     return h.completed_dates?.includes(today);
   }).length;
 
@@ -3,8 +3,9 @@ import { Card, CardContent, CardHeader, CardTitle } from '../ui/card';
 import { Progress } from '../ui/progress';
 import { Badge } from '../ui/badge';
 import { Skeleton } from '../ui/skeleton';
-import { statsAPI, habitsAPI } from '../../services/api';
+import { eventsAPI, statsAPI } from '../../services/api';
 import { useToast } from '../../hooks/use-toast';
+import { applyHabitEvent, applyOverviewEvent, isLocalEvent } from '../../lib/habitEvents';
 import { 
   TrendingUp, 
   Target, 
@@ -72,21 +73,16 @@ const HabitProgressCard = ({ habit }) => {
 };
 
 const StatsOverview = () => {
-  const [stats, setStats] = useState(null);
-  const [habits, setHabits] = useState([]);
+  // { habits, overview }, kept together so change events can update both
+  const [dashboard, setDashboard] = useState(null);
   const [loading, setLoading] = useState(true);
   const { toast } = useToast();
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [statsData, habitsData] = await Promise.all([
-          statsAPI.getOverview(),
-          habitsAPI.getHabits()
-        ]);
-        
-        setStats(statsData);
-        setHabits(habitsData);
+        // Habits and overview come from one request and one pass over the data
+        setDashboard(await statsAPI.getDashboard());
       } catch (error) {
         console.error('Failed to fetch stats:', error);
         toast({
@@ -100,8 +96,25 @@ const StatsOverview = () => {
     };
 
     fetchData();
+    // Follow changes made in other tabs and devices
+    return eventsAPI.subscribe((event) => {
+      if (!isLocalEvent(event)) {
+        fetchData();
+        return;
+      }
+      setDashboard((current) => {
+        if (!current) {
+          return current;
+        }
+        const habits = applyHabitEvent(current.habits, event);
+        return { habits, overview: applyOverviewEvent(current.overview, habits, event) };
+      });
+    });
   }, [toast]);
 
+  const stats = dashboard?.overview;
+  const habits = dashboard?.habits || [];
+
   if (loading) {
     return (
       <div className="space-y-6">
@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
-import { authAPI } from '../services/api';
+import { authAPI, browserTimezone } from '../services/api';
 
 const AuthContext = createContext();
 
@@ -11,6 +11,20 @@ export const useAuth = () => {
   return context;
 };
 
+// Accounts created before timezones were stored take the browser's, so "today"
+// matches the dates this client sends
+const withTimezone = async (userData) => {
+  if (userData.timezone) {
+    return userData;
+  }
+  try {
+    return await authAPI.updateSettings({ timezone: browserTimezone() });
+  } catch (error) {
+    console.error('Failed to store timezone:', error);
+    return userData;
+  }
+};
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -20,7 +34,7 @@ export const AuthProvider = ({ children }) => {
       const token = localStorage.getItem('access_token');
       if (token) {
         try {
-          const userData = await authAPI.getCurrentUser();
+          const userData = await withTimezone(await authAPI.getCurrentUser());
           setUser(userData);
         } catch (error) {
           console.error('Failed to get current user:', error);
@@ -41,7 +55,7 @@ export const AuthProvider = ({ children }) => {
       localStorage.setItem('access_token', tokenData.access_token);
       
       // Get user data
-      const userData = await authAPI.getCurrentUser();
+      const userData = await withTimezone(await authAPI.getCurrentUser());
       setUser(userData);
       localStorage.setItem('user', JSON.stringify(userData));
       
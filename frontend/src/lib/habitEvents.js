@@ -0,0 +1,60 @@
+// Apply change events from eventsAPI to local state instead of reloading it
+
+// Events that carry their change. Deletes take completions out of the overview, and
+// bulk changes and imports touch many habits at once; reload for those and after a reconnect.
+const LOCAL_EVENT_TYPES = ['habit.created', 'habit.updated', 'completion.created', 'completion.deleted'];
+
+export const isLocalEvent = (event) => LOCAL_EVENT_TYPES.includes(event.type);
+
+// A habit with the statistics of a CompletionResult, and its date checked or unchecked
+export function withCompletionResult(habit, result) {
+  const completedDates = (habit.completed_dates || []).filter((date) => date !== result.completion_date);
+  return {
+    ...habit,
+    current_streak: result.current_streak,
+    longest_streak: result.longest_streak,
+    completion_count: result.completion_count,
+    last_completion_date: result.last_completion_date,
+    completed_dates: result.completed ? [...completedDates, result.completion_date].sort() : completedDates,
+  };
+}
+
+// The habits list after a local event
+export function applyHabitEvent(habits, event) {
+  switch (event.type) {
+    case 'habit.created':
+      return habits.some((habit) => habit.id === event.habit.id) ? habits : [...habits, event.habit];
+    case 'habit.updated':
+      return habits.map((habit) => (habit.id === event.habit_id ? { ...habit, ...event.habit } : habit));
+    default:
+      return habits.map((habit) => (habit.id === event.habit_id ? withCompletionResult(habit, event.result) : habit));
+  }
+}
+
+// Same rounding as the server's get_completion_rate
+const completionRate = (habit) => (
+  habit.target_days ? Math.round((habit.completion_count / habit.target_days) * 1000) / 10 : 0
+);
+
+// The overview after a local event, given the habits list with the event already applied
+export function applyOverviewEvent(stats, habits, event) {
+  const next = {
+    ...stats,
+    total_habits: habits.length,
+    longest_streak: Math.max(0, ...habits.map((habit) => habit.longest_streak)),
+    avg_completion_rate: habits.length
+      ? Math.round((habits.reduce((total, habit) => total + completionRate(habit), 0) / habits.length) * 10) / 10
+      : 0,
+  };
+  if (event.result) {
+    const delta = event.result.stats_delta;
+    next.total_completions += delta.total_completions;
+    next.today_completions += delta.today_completions;
+    next.active_streaks += delta.active_streaks;
+    next.total_current_streak += delta.total_current_streak;
+    next.this_week_performance = stats.this_week_performance.map((day) => (
+      day.date === event.completion_date ? { ...day, completions: day.completions + delta.total_completions } : day
+    ));
+  }
+  return next;
+}
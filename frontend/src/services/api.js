@@ -11,12 +11,20 @@ const api = axios.create({
   },
 });
 
+// Identifies this tab, so the change events it causes are not pushed back to it
+const CLIENT_ID = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+// The browser's IANA timezone; the server uses it for "today" when the account has none stored
+export const browserTimezone = () => Intl.DateTimeFormat().resolvedOptions().timeZone;
+
 // Add auth token to requests
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem('access_token');
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  config.headers['X-Client-Id'] = CLIENT_ID;
+  config.headers['X-Timezone'] = browserTimezone();
   return config;
 });
 
@@ -40,6 +48,8 @@ export const authAPI = {
       name,
       email,
       password,
+      // Streaks and "today" are computed in this timezone
+      timezone: browserTimezone(),
     });
     return response.data;
   },
@@ -56,6 +66,18 @@ export const authAPI = {
     const response = await api.get('/auth/me');
     return response.data;
   },
+
+  // settings: { theme, timezone }; a null timezone means the server's local time
+  updateSettings: async (settings) => {
+    const response = await api.put('/auth/me/settings', settings);
+    return response.data;
+  },
+
+  // Signs the account out everywhere; its data is purged in the background
+  deleteAccount: async () => {
+    const response = await api.delete('/auth/me');
+    return response.data;
+  },
 };
 
 // Habits API calls
@@ -91,6 +113,20 @@ export const habitsAPI = {
     const response = await api.delete(`/habits/${habitId}/complete/${completionDate}`);
     return response.data;
   },
+
+  // items: [{ habit_id, completion_date, completed }], up to 1000 per call
+  bulkUpdateCompletions: async (items) => {
+    const response = await api.post('/completions/bulk', { items });
+    return response.data;
+  },
+
+  // Pages through the full history; pass the returned next_cursor to get the next page
+  getCompletions: async (habitId, cursor = null, limit = 100) => {
+    const response = await api.get(`/habits/${habitId}/completions`, {
+      params: { limit, ...(cursor ? { cursor } : {}) },
+    });
+    return response.data;
+  },
 };
 
 // Statistics API calls
@@ -99,6 +135,135 @@ export const statsAPI = {
     const response = await api.get('/stats/overview');
     return response.data;
   },
+
+  // { habits, overview }: the habits list and the overview in one response
+  getDashboard: async () => {
+    const response = await api.get('/dashboard');
+    return response.data;
+  },
+
+  // month is 1-12
+  getCalendar: async (month, year) => {
+    const response = await api.get(`/stats/calendar/${month}/${year}`);
+    return response.data;
+  },
+
+  // Completions per day for the `days` days ending today (up to 366)
+  getDailyCompletions: async (days = 30) => {
+    const response = await api.get('/stats/daily', { params: { days } });
+    return response.data;
+  },
+};
+
+// Delta sync API calls
+export const syncAPI = {
+  // { version, full, habits, completions, tombstones } changed after `since`;
+  // pass the returned version as `since` next time, 0 for everything
+  getChanges: async (since = 0) => {
+    const response = await api.get('/sync', { params: { since } });
+    return response.data;
+  },
+};
+
+// One event stream per tab, shared by every subscriber
+const eventListeners = new Set();
+let eventStream = null;
+const EVENTS_RECONNECT_DELAY_MS = 5000;
+
+const emitEvent = (event) => eventListeners.forEach((listener) => listener(event));
+
+// Connects with a fresh ticket each time: the ticket in the URL expires within a
+// minute, so EventSource's own reconnects would be refused
+const openEventStream = () => {
+  const stream = { source: null, timer: null, closed: false };
+  const retry = () => {
+    if (!stream.closed) {
+      stream.timer = setTimeout(() => connect(true), EVENTS_RECONNECT_DELAY_MS);
+    }
+  };
+  const connect = async (reconnecting) => {
+    try {
+      const { data } = await api.post('/events/ticket');
+      if (stream.closed) {
+        return;
+      }
+      const params = new URLSearchParams({ ticket: data.ticket, client_id: CLIENT_ID });
+      const source = new EventSource(`${API_BASE}/events?${params}`);
+      stream.source = source;
+      source.onmessage = (message) => emitEvent(JSON.parse(message.data));
+      source.onopen = () => {
+        // Events sent while the stream was down are lost
+        if (reconnecting) {
+          emitEvent({ type: 'reconnected' });
+        }
+      };
+      source.onerror = () => {
+        source.close();
+        retry();
+      };
+    } catch (error) {
+      retry();
+    }
+  };
+  stream.close = () => {
+    stream.closed = true;
+    clearTimeout(stream.timer);
+    stream.source?.close();
+  };
+  connect(false);
+  return stream;
+};
+
+// Change events pushed from the user's other tabs and devices
+export const eventsAPI = {
+  // Calls onEvent with each { type, habit_id, version, ... } event; returns a function that unsubscribes.
+  // Single-habit events carry the change: `habit` on habit.created and habit.updated, the
+  // CompletionResult as `result` on completion.created and completion.deleted.
+  // The stream reconnects by itself and then sends { type: 'reconnected' }; reload or
+  // call syncAPI.getChanges to catch up on missed events.
+  subscribe: (onEvent) => {
+    eventListeners.add(onEvent);
+    if (!eventStream) {
+      eventStream = openEventStream();
+    }
+    return () => {
+      eventListeners.delete(onEvent);
+      if (eventListeners.size === 0 && eventStream) {
+        eventStream.close();
+        eventStream = null;
+      }
+    };
+  },
+};
+
+// Export and import API calls
+export const exportAPI = {
+  // format is 'ndjson' or 'csv'; resolves to a Blob to save as a file
+  downloadHistory: async (format = 'ndjson') => {
+    const response = await api.get('/export', {
+      params: { format },
+      responseType: 'blob',
+    });
+    return response.data;
+  },
+
+  // file is a CSV or NDJSON File; resolves to an import job to poll with getImportJob
+  importHistory: async (file, format = null) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    if (format) {
+      formData.append('format', format);
+    }
+    const response = await api.post('/import', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+    return response.data;
+  },
+
+  getImportJob: async (jobId) => {
+    const response = await api.get(`/import/${jobId}`);
+    return response.data;
+  },
 };
 
 export default api;
\ No newline at end of file
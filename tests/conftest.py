@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend is a flat set of modules imported by name, as when running from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# database.py builds its client at import time; no server is contacted until a command runs
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "habitflow_test")
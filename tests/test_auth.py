@@ -0,0 +1,39 @@
+"""Event stream tickets and access tokens are not interchangeable."""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+from models import User
+
+@pytest.fixture
+def user():
+    user = User(name="Test", email="test@example.com", password_hash="x")
+    auth.user_cache.set(user.id, user)
+    yield user
+    auth.user_cache.invalidate(user)
+
+def test_ticket_opens_streams_until_the_session_expires(user):
+    access_token = auth.create_access_token({"sub": user.email, "uid": user.id}, timedelta(minutes=30))
+    ticket = auth.create_events_ticket(user, access_token)
+    
+    resolved, session_expires_at = asyncio.run(auth.get_user_from_events_ticket(ticket))
+    assert resolved.id == user.id
+    assert session_expires_at == auth.jwt.get_unverified_claims(access_token)["exp"]
+
+def test_ticket_is_not_an_access_token(user):
+    access_token = auth.create_access_token({"sub": user.email, "uid": user.id}, timedelta(minutes=30))
+    ticket = auth.create_events_ticket(user, access_token)
+    
+    with pytest.raises(HTTPException):
+        asyncio.run(auth.get_user_from_token(ticket))
+    with pytest.raises(HTTPException):
+        asyncio.run(auth.get_user_from_events_ticket(access_token))
+
+def test_ticket_does_not_outlive_the_access_token(user):
+    access_token = auth.create_access_token({"sub": user.email, "uid": user.id}, timedelta(seconds=5))
+    ticket = auth.create_events_ticket(user, access_token)
+    assert auth.jwt.get_unverified_claims(ticket)["exp"] <= auth.jwt.get_unverified_claims(access_token)["exp"]
@@ -0,0 +1,37 @@
+"""Which day counts as "today" for check-ins."""
+
+import asyncio
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from models import User
+from server import get_date_context
+from utils import DateContext
+
+def user(timezone=None) -> User:
+    return User(name="Test", email="test@example.com", password_hash="x", timezone=timezone)
+
+def test_known_timezone_accepts_up_to_today():
+    context = DateContext.for_timezone("Asia/Tokyo")
+    tokyo_today = datetime.now(ZoneInfo("Asia/Tokyo")).date()
+    assert context.today == tokyo_today
+    assert context.latest_date_str == context.today_str
+
+def test_unknown_timezone_accepts_tomorrow():
+    # A client east of the server is already on the server's tomorrow
+    context = DateContext.for_timezone(None)
+    assert context.latest_date_str == (context.today + timedelta(days=1)).isoformat()
+
+def test_user_without_timezone_uses_the_browser_zone():
+    context = asyncio.run(get_date_context(timezone="Pacific/Kiritimati", current_user=user()))
+    assert context.today == datetime.now(ZoneInfo("Pacific/Kiritimati")).date()
+    assert context.latest_date_str == context.today_str
+
+def test_stored_timezone_wins_over_the_browser_zone():
+    context = asyncio.run(get_date_context(timezone="Pacific/Kiritimati", current_user=user("Pacific/Pago_Pago")))
+    assert context.today == datetime.now(ZoneInfo("Pacific/Pago_Pago")).date()
+
+def test_unknown_browser_zone_is_ignored():
+    context = asyncio.run(get_date_context(timezone="Not/AZone", current_user=user()))
+    assert context.today == date.today()
+    assert context.latest_date_str == (context.today + timedelta(days=1)).isoformat()
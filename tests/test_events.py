@@ -0,0 +1,46 @@
+"""Change events reach the user's other streams in this worker."""
+
+import asyncio
+import time
+
+from events import ACCOUNT_DELETED_EVENT, EventHub, MemoryEventBackend
+
+def test_memory_backend_delivers_without_start():
+    async def scenario():
+        # Startup hooks do not run under httpx.ASGITransport, as in benchmarks/load_test.py
+        hub = EventHub(MemoryEventBackend())
+        mine = hub.subscribe("user", "tab-1")
+        other = hub.subscribe("user", "tab-2")
+        stranger = hub.subscribe("someone-else")
+        
+        await hub.publish("user", {"type": "habit.deleted", "habit_id": "habit", "version": 1}, "tab-1")
+        
+        assert mine.queue.empty()
+        assert other.queue.get_nowait()["habit_id"] == "habit"
+        assert stranger.queue.empty()
+    
+    asyncio.run(scenario())
+
+async def read_stream(stream):
+    return [chunk async for chunk in stream]
+
+def test_stream_closes_when_the_session_expires():
+    async def scenario():
+        hub = EventHub(MemoryEventBackend())
+        chunks = await asyncio.wait_for(read_stream(hub.stream("user", expires_at=time.time() + 0.2)), 5)
+        assert chunks[0].startswith(b"retry:")
+        assert not hub._subscriptions
+    
+    asyncio.run(scenario())
+
+def test_stream_closes_after_account_deleted():
+    async def scenario():
+        hub = EventHub(MemoryEventBackend())
+        reader = asyncio.create_task(read_stream(hub.stream("user")))
+        await asyncio.sleep(0)
+        await hub.publish("user", {"type": ACCOUNT_DELETED_EVENT})
+        chunks = await asyncio.wait_for(reader, 5)
+        assert chunks[-1] == b'data: {"type":"account.deleted"}\n\n'
+        assert not hub._subscriptions
+    
+    asyncio.run(scenario())
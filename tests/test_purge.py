@@ -0,0 +1,84 @@
+"""Purging leaves the daily rollups matching the completions, and waits for writes in flight."""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import purge
+import rollups
+import sync
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["habitflow_test"]
+    for module in (purge, rollups, sync):
+        monkeypatch.setattr(module, "db", database)
+    monkeypatch.setattr(purge, "PURGE_BATCH_DELAY_SECONDS", 0)
+    asyncio.run(database.users.insert_one({"id": "user", "deleted_at": None}))
+    return database
+
+async def check_in(db, completion_date: str):
+    await db.habit_completions.insert_one({
+        "id": completion_date, "habit_id": "habit", "user_id": "user", "completion_date": completion_date
+    })
+    await rollups.apply_rollup_delta("user", {completion_date: 1})
+
+async def delete_habit(db):
+    # As DELETE /habits/{id} does
+    counts = await rollups.count_completions_by_date({"user_id": "user", "habit_id": "habit"})
+    await db.habits.insert_one({
+        "id": "habit", "user_id": "user", "deleted_at": datetime.utcnow(), "rollups_removed": counts
+    })
+    await rollups.apply_rollup_delta("user", {day: -count for day, count in counts.items()})
+
+async def rollup_counts(db):
+    return {rollup["date"]: rollup["completions"] async for rollup in db.daily_rollups.find({})}
+
+def test_check_in_landing_after_the_delete_counted(db):
+    async def scenario():
+        await check_in(db, "2024-03-01")
+        await delete_habit(db)
+        await check_in(db, "2024-03-02")
+        assert await purge.purge_deleted() == 1
+        assert await db.habit_completions.count_documents({}) == 0
+        assert await db.habits.count_documents({}) == 0
+        assert await rollup_counts(db) == {"2024-03-01": 0, "2024-03-02": 0}
+    
+    asyncio.run(scenario())
+
+def test_interrupted_purge_settles_once(db):
+    async def scenario():
+        await check_in(db, "2024-03-01")
+        await delete_habit(db)
+        await check_in(db, "2024-03-01")
+        habit_doc = await db.habits.find_one({"id": "habit"})
+        await purge.purge_habit(habit_doc)
+        # A second worker that read the habit before the first one finished
+        await purge.purge_habit(habit_doc)
+        assert await rollup_counts(db) == {"2024-03-01": 0}
+    
+    asyncio.run(scenario())
+
+def test_deleted_account_waits_for_writes_in_flight(db):
+    async def scenario():
+        async with sync.sync_write("user"):
+            await db.users.update_one({"id": "user"}, {"$set": {"deleted_at": datetime.utcnow()}})
+            assert await purge.purge_deleted() == 0
+            await check_in(db, "2024-03-01")
+        assert await purge.purge_deleted() == 1
+        assert await db.users.count_documents({}) == 0
+        assert await db.habit_completions.count_documents({}) == 0
+    
+    asyncio.run(scenario())
+
+def test_deleted_account_cannot_reserve(db):
+    async def scenario():
+        await db.users.update_one({"id": "user"}, {"$set": {"deleted_at": datetime.utcnow()}})
+        with pytest.raises(sync.HTTPException) as error:
+            await sync.reserve_sync_version("user")
+        assert error.value.status_code == 401
+    
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+"""recompute_stats.py --dedupe clears the way for the unique completion index."""
+
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import recompute_stats
+import rollups
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["habitflow_test"]
+    monkeypatch.setattr(recompute_stats, "db", database)
+    monkeypatch.setattr(rollups, "db", database)
+    return database
+
+def completion(habit_id: str, completion_date: str, user_id: str = "user"):
+    return {"id": f"{habit_id}-{completion_date}", "user_id": user_id, "habit_id": habit_id, "completion_date": completion_date}
+
+def test_dedupe_keeps_one_completion_per_habit_and_day(db):
+    async def scenario():
+        await db.habits.insert_many([{"id": "a", "user_id": "user"}, {"id": "b", "user_id": "other"}])
+        await db.habit_completions.insert_many([
+            completion("a", "2024-03-01"), completion("a", "2024-03-01"), completion("a", "2024-03-01"),
+            completion("a", "2024-03-02"),
+            completion("b", "2024-03-01", "other"), completion("b", "2024-03-01", "other"),
+        ])
+        
+        assert await recompute_stats.remove_duplicate_completions("user") == 2
+        assert await db.habit_completions.count_documents({"habit_id": "b"}) == 2
+        assert await recompute_stats.remove_duplicate_completions() == 1
+        
+        remaining = await db.habit_completions.find({}, {"_id": 0, "habit_id": 1, "completion_date": 1}).to_list(None)
+        assert sorted((doc["habit_id"], doc["completion_date"]) for doc in remaining) == [
+            ("a", "2024-03-01"), ("a", "2024-03-02"), ("b", "2024-03-01")
+        ]
+        
+        await recompute_stats.recompute_all()
+        habit = await db.habits.find_one({"id": "a"})
+        assert (habit["completion_count"], habit["longest_streak"]) == (2, 2)
+    
+    asyncio.run(scenario())
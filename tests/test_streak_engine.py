@@ -0,0 +1,55 @@
+"""The vectorized streak engine agrees with calculate_streaks and CompletionStatsAccumulator."""
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from streak_engine import batch_streaks, batch_summaries
+from utils import CompletionStatsAccumulator, calculate_streaks
+
+TODAY = date(2024, 3, 15)
+
+def random_histories(rng: random.Random) -> dict:
+    """Histories keyed by habit id, with duplicate days and days after TODAY."""
+    histories = {}
+    for habit in range(rng.randint(1, 12)):
+        span = rng.randint(1, 40)
+        days = [(TODAY + timedelta(days=rng.randint(-span, 3))).isoformat() for _ in range(rng.randint(1, span))]
+        # Repeat some days, as histories written before the unique index may
+        days += rng.sample(days, rng.randint(0, min(3, len(days))))
+        histories[f"habit-{habit}"] = days
+    return histories
+
+def columns(histories: dict, rng: random.Random):
+    """Parallel habit id and date columns, in no particular order."""
+    rows = [(habit_id, completion_date) for habit_id, days in histories.items() for completion_date in days]
+    rng.shuffle(rows)
+    return [habit_id for habit_id, _ in rows], [completion_date for _, completion_date in rows]
+
+@pytest.mark.parametrize("seed", range(300))
+def test_batch_streaks_matches_calculate_streaks(seed):
+    rng = random.Random(seed)
+    histories = random_histories(rng)
+    habit_ids, completion_dates = columns(histories, rng)
+    for today in (TODAY, TODAY + timedelta(days=1), TODAY + timedelta(days=5)):
+        expected = {habit_id: calculate_streaks(days, today=today) for habit_id, days in histories.items()}
+        assert batch_streaks(habit_ids, completion_dates, today) == expected
+
+@pytest.mark.parametrize("seed", range(300))
+def test_batch_summaries_matches_accumulator(seed):
+    rng = random.Random(seed)
+    histories = random_histories(rng)
+    expected = {}
+    for habit_id, days in histories.items():
+        accumulator = CompletionStatsAccumulator()
+        for completion_date in sorted(days):
+            accumulator.add(completion_date)
+        expected[habit_id] = accumulator.stats()
+    assert batch_summaries(*columns(histories, rng)) == expected
+
+def test_empty_input():
+    assert batch_streaks([], [], TODAY) == {}
+    assert batch_summaries([], []) == {}
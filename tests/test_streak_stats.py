@@ -0,0 +1,79 @@
+"""The incrementally maintained streak statistics agree with calculate_streaks."""
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from utils import (
+    CompletionStatsAccumulator, DateContext, apply_completion_to_stats,
+    apply_uncompletion_to_stats, calculate_streaks, current_streak_as_of
+)
+
+TODAY = date(2024, 3, 15)
+
+def day(offset: int) -> str:
+    return (TODAY - timedelta(days=offset)).isoformat()
+
+def recompute(dates) -> dict:
+    """The full recompute the server falls back to."""
+    accumulator = CompletionStatsAccumulator()
+    for completion_date in sorted(dates):
+        accumulator.add(completion_date)
+    return accumulator.stats()
+
+def assert_matches(stats: dict, dates, today: date = TODAY):
+    current_streak, longest_streak = calculate_streaks(list(dates), today=today)
+    assert current_streak_as_of(stats, DateContext.for_date(today)) == current_streak
+    assert stats["longest_streak"] == longest_streak
+    assert stats["completion_count"] == len(dates)
+    assert stats["last_completion_date"] == (max(dates) if dates else None)
+
+def random_history(rng: random.Random) -> list:
+    # Clustered days so histories have runs, gaps and single-day gaps
+    span = rng.randint(1, 40)
+    return sorted({day(rng.randint(0, span)) for _ in range(rng.randint(0, span))})
+
+@pytest.mark.parametrize("seed", range(200))
+def test_recompute_matches_calculate_streaks(seed):
+    dates = random_history(random.Random(seed))
+    for today in (TODAY, TODAY + timedelta(days=1), TODAY + timedelta(days=2)):
+        assert_matches(recompute(dates), dates, today)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_completions_applied_one_by_one(seed):
+    rng = random.Random(seed)
+    history = random_history(rng)
+    rng.shuffle(history)
+    stats, dates = recompute([]), []
+    for completion_date in history:
+        dates.append(completion_date)
+        stats = apply_completion_to_stats(stats, completion_date) or recompute(dates)
+        assert_matches(stats, dates)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_uncompletions_applied_one_by_one(seed):
+    rng = random.Random(seed)
+    dates = random_history(rng)
+    stats = recompute(dates)
+    while dates:
+        # Mostly remove the latest day, the case handled without a recompute
+        removed = dates[-1] if rng.random() < 0.7 else rng.choice(dates)
+        dates.remove(removed)
+        stats = apply_uncompletion_to_stats(stats, removed) or recompute(dates)
+        assert_matches(stats, dates)
+
+def test_out_of_order_completion_needs_recompute():
+    stats = recompute([day(1), day(0)])
+    assert apply_completion_to_stats(stats, day(3)) is None
+    assert apply_completion_to_stats(stats, day(0)) is None
+
+def test_removing_part_of_longest_streak_needs_recompute():
+    stats = recompute([day(2), day(1), day(0)])
+    assert apply_uncompletion_to_stats(stats, day(0)) is None
+
+def test_streak_survives_until_end_of_next_day():
+    stats = recompute([day(2), day(1)])
+    assert current_streak_as_of(stats, DateContext.for_date(TODAY)) == 2
+    assert current_streak_as_of(stats, DateContext.for_date(TODAY + timedelta(days=1))) == 0
+    assert current_streak_as_of(recompute([]), DateContext.for_date(TODAY)) == 0
@@ -0,0 +1,98 @@
+"""Sync only reports versions whose writes have landed."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import purge
+import sync
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["habitflow_test"]
+    monkeypatch.setattr(sync, "db", database)
+    monkeypatch.setattr(purge, "db", database)
+    asyncio.run(database.users.insert_one({"id": "user"}))
+    return database
+
+async def insert_completion(db, version: int, completion_date: str):
+    await db.habit_completions.insert_one({
+        "id": completion_date, "habit_id": "habit", "user_id": "user",
+        "completion_date": completion_date, "created_at": datetime.utcnow(), "version": version
+    })
+
+async def sync_once(since: int):
+    until = await sync.committed_sync_version("user")
+    return until, await sync.changes_since("user", since, until)
+
+def test_sync_between_reserving_and_inserting(db):
+    async def scenario():
+        async with sync.sync_write("user") as version:
+            # The version is taken but the completion is not there yet
+            until, changes = await sync_once(0)
+            assert until == version - 1
+            assert changes["completions"] == []
+            await insert_completion(db, version, "2024-03-01")
+        
+        until, changes = await sync_once(until)
+        assert until == version
+        assert [completion["completion_date"] for completion in changes["completions"]] == ["2024-03-01"]
+    
+    asyncio.run(scenario())
+
+def test_tombstone_reserved_before_it_is_written(db):
+    async def scenario():
+        async with sync.sync_write("user") as version:
+            await insert_completion(db, version, "2024-03-01")
+        async with sync.sync_write("user") as version:
+            until, changes = await sync_once(0)
+            assert until == version - 1
+            await db.habit_completions.delete_one({"completion_date": "2024-03-01"})
+            await sync.add_tombstones("user", version, completions=[("habit", "2024-03-01")])
+        
+        until, changes = await sync_once(until)
+        assert [tombstone["version"] for tombstone in changes["tombstones"]] == [version]
+    
+    asyncio.run(scenario())
+
+def test_later_write_landing_first_waits_for_earlier_one(db):
+    async def scenario():
+        first = await sync.reserve_sync_version("user")
+        second = await sync.reserve_sync_version("user")
+        await insert_completion(db, second, "2024-03-02")
+        await sync.release_sync_version("user", second)
+        assert await sync.committed_sync_version("user") == first - 1
+        
+        await insert_completion(db, first, "2024-03-01")
+        await sync.release_sync_version("user", first)
+        until, changes = await sync_once(first - 1)
+        assert until == second
+        assert sorted(completion["version"] for completion in changes["completions"]) == [first, second]
+    
+    asyncio.run(scenario())
+
+def test_abandoned_reservation_expires(db):
+    async def scenario():
+        await sync.reserve_sync_version("user")
+        await db.users.update_one(
+            {"id": "user"},
+            {"$set": {"sync_pending.0.reserved_at": datetime.utcnow() - timedelta(hours=1)}}
+        )
+        assert await sync.committed_sync_version("user") == 1
+        user_doc = await db.users.find_one({"id": "user"})
+        assert user_doc["sync_pending"] == []
+    
+    asyncio.run(scenario())
+
+def test_concurrent_reservations_get_distinct_versions(db):
+    async def scenario():
+        versions = await asyncio.gather(*(sync.reserve_sync_version("user") for _ in range(20)))
+        assert sorted(versions) == list(range(1, 21))
+        user_doc = await db.users.find_one({"id": "user"})
+        assert sorted(entry["version"] for entry in user_doc["sync_pending"]) == list(range(1, 21))
+        assert await sync.committed_sync_version("user") == 0
+    
+    asyncio.run(scenario())